@@ -0,0 +1,351 @@
+"""
+Benchmarks for the app's hot paths.
+
+Covers both simulation engines across policies, horizons and run counts,
+each timestep granularity, the agent-level engine at a million holders,
+the Proactive policy on its own, the chart builders and downsampling,
+and response-surface lookups against live simulation. Results are written
+as JSON, each with a regression threshold, and a previous results file can
+be passed back in to fail on any case slower than its threshold.
+
+Usage:
+
+    python bench.py --output bench.json
+    python bench.py --baseline bench.json
+"""
+import argparse
+import json
+import sys
+import tempfile
+import timeit
+
+import numpy as np
+
+from chart import ChartData, StakePropensityChart, point_budget
+from model import (
+    BEHAVIOR2POLICY,
+    TIMESTEPS,
+    compute_stake_propensity,
+    proactive_behavior_policy,
+)
+from surface import ResponseSurface
+from utils import build_simulation, default_params, load_constants, simulate
+
+
+BACKENDS = ("numpy", "cadcad")
+POLICIES = ("Constant", "Proactive")
+RUN_COUNTS = (1, 100, 10_000)
+# cadCAD builds a dict per run and step, so larger cases would take hours.
+MAX_CADCAD_STEPS = 10_000
+
+
+def time_per_call(func, number=100, repeat=5):
+    """
+    Return the best-of-`repeat` mean seconds per call of `func`.
+
+    When `number` is None, it is picked so each repeat takes at least 0.2s.
+    """
+    timer = timeit.Timer(func)
+    if number is None:
+        number, _ = timer.autorange()
+    return min(timer.repeat(number=number, repeat=repeat)) / number
+
+
+def per_row_chart_frames(df):
+    """
+    The chart updates as they were before `ChartData`: each playback row was
+    rescaled and melted on its own, once per chart.
+    """
+    for i in range(len(df)):
+        row = df.iloc[[i]]
+        row.assign(perc_staked=row["perc_staked"] * 100)
+        row.assign(staker_yield=row["staker_yield"] * 100)
+        (
+            row[["unstaked_dilution", "staked_dilution", "timestep"]]
+            .melt("timestep", var_name="cohort", value_name="dilution")
+            .assign(cohort=lambda df: df["cohort"].str.replace("_dilution", ""))
+            .assign(dilution=lambda df: df["dilution"] * 100)
+        )
+        (
+            row[["unstaked_valuation", "staked_valuation", "timestep"]]
+            .melt("timestep", var_name="cohort", value_name="valuation")
+            .assign(cohort=lambda df: df["cohort"].str.replace("_valuation", ""))
+        )
+
+
+def chart_data_frames(df):
+    """
+    The chart updates through `ChartData`: one reshape, then row slices.
+    """
+    data = ChartData(df)
+    for i in range(len(df)):
+        data.wide_rows(i, i + 1)
+        data.wide_rows(i, i + 1)
+        data.long_rows(i, i + 1)
+        data.long_rows(i, i + 1)
+
+
+def bench_chart_frames():
+    df = simulate()
+    num_frames = len(df)
+    results = {}
+    for name, func in [
+        ("per-row melt/assign", per_row_chart_frames),
+        ("ChartData slices", chart_data_frames),
+    ]:
+        secs = time_per_call(lambda: func(df), number=10)
+        print(f"chart frames, {name}: {secs / num_frames * 1e6:.1f} us/frame")
+        results[f"chart/frames/{name}"] = secs
+    return results
+
+
+def bench_chart_downsample(years=200, steps_per_year=182):
+    params = dict(default_params(), steps_per_year=steps_per_year)
+    data = ChartData(simulate(params, years * steps_per_year))
+    max_points = point_budget(load_constants()["chart_width"])
+    secs = time_per_call(lambda: data.downsample(max_points), number=None)
+    print(f"chart downsample, {len(data.wide)} timesteps: {secs * 1e3:.2f} ms")
+    return {f"chart/ChartData.downsample/timesteps={len(data.wide)}": secs}
+
+
+def bench_surface(step=0.01):
+    ranges = {
+        "base_infl_rate": np.arange(0, 0.2 + step / 2, step).round(10),
+        "dis_infl_rate": np.arange(-0.2, step / 2, step).round(10),
+        "long_term_infl_rate": np.arange(0, 0.2 + step / 2, step).round(10),
+    }
+    # Off the grid, so every gridded param is interpolated. The app only
+    # looks up Proactive results, as Constant ones are solved in closed form.
+    params = dict(
+        default_params(),
+        staked_policy="Proactive",
+        unstaked_policy="Proactive",
+        base_infl_rate=0.0725,
+        dis_infl_rate=-0.1333,
+        long_term_infl_rate=0.0211,
+    )
+    steps = load_constants()["total_years"]
+    simulation = build_simulation(params, steps, backend="numpy")
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        surface = ResponseSurface.build(
+            f"{tmp_dir}/surface", ranges, base_params=params, processes=1
+        )
+        for name, func in [
+            ("lookup", lambda: surface.lookup(params, steps, backend="numpy")),
+            ("simulate", simulation.result),
+        ]:
+            secs = time_per_call(func, number=None)
+            print(f"response surface, {name}: {secs * 1e3:.2f} ms")
+            results[f"surface/{name}/points={surface.store.num_points}"] = secs
+    return results
+
+
+def bench_stake_propensity_chart():
+    C = load_constants()
+    secs = time_per_call(
+        lambda: StakePropensityChart.build(C["yield_location"], C["yield_scale"])
+    )
+    print(f"stake propensity chart: {secs * 1e3:.2f} ms/build")
+    return {"chart/StakePropensityChart.build": secs}
+
+
+def backend_unavailable(backend):
+    """
+    Return why `backend` cannot run here, or None if it can.
+    """
+    if backend != "cadcad":
+        return None
+    try:
+        import cadCAD  # noqa: F401
+    except ImportError as e:
+        return str(e)
+    return None
+
+
+def bench_engines(backends=BACKENDS, run_counts=RUN_COUNTS):
+    """
+    Time each engine on its own: simulations are built, and their params
+    resolved, outside the timed calls.
+    """
+    results = {}
+    horizons = sorted({load_constants()["total_years"], 100, 1000})
+    for backend in backends:
+        reason = backend_unavailable(backend)
+        if reason is not None:
+            print(f"Skipping {backend} engine: {reason}")
+            continue
+        for policy in POLICIES:
+            params = dict(
+                default_params(), staked_policy=policy, unstaked_policy=policy
+            )
+            for steps in horizons:
+                for num_runs in run_counts:
+                    if backend == "cadcad" and steps * num_runs > MAX_CADCAD_STEPS:
+                        continue
+                    simulation = build_simulation(params, steps, num_runs, backend)
+                    secs = time_per_call(simulation.result, number=None, repeat=3)
+                    name = f"engine/{backend}/{policy}/steps={steps}/runs={num_runs}"
+                    print(f"{name}: {secs * 1e3:.2f} ms/run")
+                    results[name] = secs
+    return results
+
+
+def bench_timesteps(num_runs=100):
+    results = {}
+    total_years = load_constants()["total_years"]
+    for policy in POLICIES:
+        for timestep, steps_per_year in TIMESTEPS.items():
+            params = dict(
+                default_params(),
+                staked_policy=policy,
+                unstaked_policy=policy,
+                steps_per_year=steps_per_year,
+            )
+            simulation = build_simulation(
+                params, total_years * steps_per_year, num_runs, "numpy"
+            )
+            secs = time_per_call(simulation.result, number=None, repeat=3)
+            name = f"engine/timestep={timestep}/{policy}/runs={num_runs}"
+            print(f"{name}: {secs * 1e3:.2f} ms/run")
+            results[name] = secs
+    return results
+
+
+def bench_agents(num_agents=1_000_000, steps=100):
+    results = {}
+    for policy in POLICIES:
+        params = dict(
+            default_params(),
+            staked_policy=policy,
+            unstaked_policy=policy,
+            num_agents=num_agents,
+        )
+        simulation = build_simulation(params, steps, backend="agents")
+        secs = time_per_call(simulation.result, number=1, repeat=3)
+        name = f"engine/agents/{policy}/steps={steps}/agents={num_agents}"
+        print(f"{name}: {secs:.2f} s/run")
+        results[name] = secs
+    return results
+
+
+def scipy_behavior_policy(
+    behavior, previous_yield, yield_location, yield_scale, rng=None
+):
+    """
+    `proactive_behavior_policy` as it was before it took a seeded generator:
+    one unseeded `scipy.stats.beta.rvs` call per draw.
+    """
+    from scipy.stats import beta
+
+    stake_propensity = compute_stake_propensity(
+        previous_yield, yield_location, yield_scale
+    )
+    keep_strat_frac = stake_propensity if behavior == "staked" else 1 - stake_propensity
+    keep_strat_frac = beta.rvs(
+        (keep_strat_frac * 100) + 1,
+        ((1 - keep_strat_frac) * 100) + 1,
+        size=np.shape(previous_yield) or 1,
+    )
+    return keep_strat_frac.item() if np.ndim(previous_yield) == 0 else keep_strat_frac
+
+
+def bench_policy_calls(num_runs=100):
+    C = load_constants()
+    rng = np.random.default_rng(0)
+    results = {}
+    for shape in [(), (num_runs,)]:
+        previous_yield = np.full(shape, C["yield_location"])[()]
+        secs = time_per_call(
+            lambda: proactive_behavior_policy(
+                "staked", previous_yield, C["yield_location"], C["yield_scale"], rng
+            ),
+            number=None,
+        )
+        size = int(np.prod(shape))
+        print(f"proactive policy, {size} draws/call: {1 / secs:,.0f} calls/s")
+        results[f"policy/proactive_behavior_policy/draws={size}"] = secs
+    return results
+
+
+def bench_proactive_policy(num_runs=100):
+    params = dict(
+        default_params(), staked_policy="Proactive", unstaked_policy="Proactive"
+    )
+    policy = BEHAVIOR2POLICY["Proactive"]
+    results = {}
+    for name, func in [
+        ("scipy beta.rvs", scipy_behavior_policy),
+        ("seeded Generator", policy),
+    ]:
+        # Policies are looked up when the simulation is built.
+        BEHAVIOR2POLICY["Proactive"] = func
+        try:
+            simulation = build_simulation(params, num_runs=num_runs, backend="numpy")
+            secs = time_per_call(simulation.result, number=10)
+        finally:
+            BEHAVIOR2POLICY["Proactive"] = policy
+        print(f"proactive ensemble, {num_runs} runs, {name}: {secs * 1e3:.2f} ms/run")
+        results[f"policy/ensemble/runs={num_runs}/{name}"] = secs
+    return results
+
+
+def check(results, baseline):
+    """
+    Return the names of cases in `results` slower than their threshold in
+    `baseline`, a previous output of this script.
+    """
+    return [
+        name
+        for name, secs in results.items()
+        if name in baseline and secs > baseline[name]["threshold"]
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--baseline", help="Fail on regressions against this JSON")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=1.5,
+        help="Threshold written for each case, as a multiple of its time",
+    )
+    parser.add_argument("--backend", choices=BACKENDS, action="append")
+    parser.add_argument("--runs", type=int, action="append", help="Run counts")
+    parser.add_argument("--agents", type=int, default=1_000_000)
+    args = parser.parse_args(argv)
+
+    results = {
+        **bench_engines(args.backend or BACKENDS, args.runs or RUN_COUNTS),
+        **bench_timesteps(),
+        **bench_agents(args.agents),
+        **bench_policy_calls(),
+        **bench_proactive_policy(),
+        **bench_stake_propensity_chart(),
+        **bench_chart_downsample(),
+        **bench_chart_frames(),
+        **bench_surface(),
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    name: {"seconds": secs, "threshold": secs * args.tolerance}
+                    for name, secs in results.items()
+                },
+                f,
+                indent=2,
+            )
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = check(results, json.load(f))
+        for name in regressions:
+            print(f"Regression: {name}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+from collections import OrderedDict
+from concurrent.futures import Future
+import hashlib
+import json
+import os
+import threading
+
+import pandas as pd
+
+from profiling import stage
+from utils import build_simulation, default_params, load_constants
+
+
+def simulation_key(**inputs):
+    """
+    Hash simulation inputs into a canonical cache key.
+
+    Inputs are serialized as sorted JSON, so dict ordering and int/float
+    spelling of the same value (e.g. `1` vs `1.0`) do not change the key.
+    """
+    canonical = json.dumps(
+        {name: _canonicalize(val) for name, val in inputs.items()},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def read_only_frame(df):
+    """
+    Return `df` with every column backed by a read-only array, copying only
+    the columns that are writable.
+    """
+    columns = {}
+    for col in df.columns:
+        vals = df[col].to_numpy()
+        if vals.flags.writeable:
+            vals = vals.copy()
+            vals.setflags(write=False)
+        columns[col] = vals
+    frozen = pd.DataFrame(columns, index=df.index, copy=False)
+    frozen.attrs = dict(df.attrs)
+    return frozen
+
+
+def _canonicalize(val):
+    if isinstance(val, dict):
+        return {key: _canonicalize(v) for key, v in val.items()}
+    if isinstance(val, (int, float)) and not isinstance(val, bool):
+        return float(val)
+    return val
+
+
+class SimulationCache:
+    """
+    Two-level cache of simulation results.
+
+    Results live in an in-process LRU, evicted by their in-memory size, and
+    optionally in Parquet files under `cache_dir`, which survive restarts and
+    are shared by every process pointed at the same directory.
+
+    Cached frames are shared between callers without copying, so their
+    columns are read-only arrays. Concurrent requests for a result that is
+    not cached yet wait on a single computation of it.
+
+    On a miss, results are looked up in `surface`, a
+    `surface.ResponseSurface`, if it covers them, and only simulated if not.
+    Simulations solved in closed form skip the surface. Interpolated results
+    only approximate the seeded simulation, so they are cached under their
+    own key, in memory only, and their frames have `attrs["interpolated"]`
+    set.
+    """
+
+    def __init__(self, max_bytes=256 * 2**20, cache_dir=None, surface=None):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.surface = surface
+        self.num_bytes = 0
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.parquet")
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key][0]
+        if self.cache_dir is not None and os.path.exists(self._path(key)):
+            df = read_only_frame(pd.read_parquet(self._path(key)))
+            self._put_memory(key, df)
+            return df
+        return None
+
+    def put(self, key, df, persist=True):
+        """
+        Cache `df` under `key`, and return the read-only frame cached.
+
+        Only frames with `persist` set are written to `cache_dir`.
+        """
+        df = read_only_frame(df)
+        self._put_memory(key, df)
+        if persist and self.cache_dir is not None:
+            # Write then rename, so concurrent readers never see partial files.
+            tmp_path = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}"
+            df.to_parquet(tmp_path)
+            os.replace(tmp_path, self._path(key))
+        return df
+
+    def _claim(self, key):
+        """
+        Return a future for the result under `key` if it is cached or another
+        caller is computing it. Otherwise return None, and the caller must
+        compute it and `_release` the key.
+        """
+        with self._lock:
+            if key in self._entries:
+                future = Future()
+                future.set_result(self._entries[key][0])
+                return future
+            if key in self._pending:
+                return self._pending[key]
+            self._pending[key] = Future()
+            return None
+
+    def _release(self, key, df):
+        """
+        Hand `df` to every caller waiting on `key`. A `df` of None, from a
+        computation that failed or was abandoned, makes them retry.
+        """
+        with self._lock:
+            future = self._pending.pop(key)
+        future.set_result(df)
+
+    def _get_or_claim(self, key):
+        """
+        Return the result under `key`, waiting for any caller computing it,
+        or None once this caller has claimed it.
+        """
+        while True:
+            df = self.get(key)
+            if df is not None:
+                return df
+            future = self._claim(key)
+            if future is None:
+                return None
+            df = future.result()
+            if df is not None:
+                return df
+
+    def _put_memory(self, key, df):
+        num_bytes = df.memory_usage(deep=True).sum()
+        with self._lock:
+            if key in self._entries:
+                self.num_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (df, num_bytes)
+            self.num_bytes += num_bytes
+            while self.num_bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self.num_bytes -= evicted_bytes
+
+    def run(
+        self,
+        params,
+        steps_per_run,
+        num_runs=1,
+        backend="cadcad",
+        progress=None,
+        cancelled=None,
+    ):
+        """
+        Return the simulation for `params` (see `utils.default_params`),
+        running it only on a cache miss.
+
+        `progress` and `cancelled` are passed to the simulation's `result`,
+        and only apply if this call runs it.
+        """
+        params = {**default_params(), **params}
+        simulation = build_simulation(params, steps_per_run, num_runs, backend)
+        surface = self._surface_for(
+            simulation, params, steps_per_run, num_runs, backend
+        )
+        key = self._key(params, steps_per_run, num_runs, backend, surface)
+        df = self._get_or_claim(key)
+        if df is not None:
+            return df
+        try:
+            if surface is None:
+                result = simulation.result(progress, cancelled)
+            else:
+                with stage("simulation.surface_lookup"):
+                    result = surface.lookup(params, steps_per_run, num_runs, backend)
+            result = result.freeze()
+            with stage("simulation.to_dataframe"):
+                df = result.to_pandas()
+            df = self._label(df, surface)
+            df = self.put(key, df, persist=surface is None)
+        finally:
+            self._release(key, df)
+        return df
+
+    def stream(self, params, steps_per_run, num_runs=1, backend="cadcad", chunk_size=1):
+        """
+        Yield the simulation for `params` as frames of `chunk_size` timesteps
+        across every run.
+
+        On a cache miss, chunks are yielded as the engine computes them, and
+        the whole result is cached once the last one is consumed. Concurrent
+        callers wait on it until then, so callers that pace their playback
+        should `run` the simulation first.
+        """
+        params = {**default_params(), **params}
+        simulation = build_simulation(params, steps_per_run, num_runs, backend)
+        surface = self._surface_for(
+            simulation, params, steps_per_run, num_runs, backend
+        )
+        key = self._key(params, steps_per_run, num_runs, backend, surface)
+        df = self._get_or_claim(key)
+        if df is not None:
+            for start in range(0, steps_per_run + 1, chunk_size):
+                yield df[df["timestep"].between(start, start + chunk_size - 1)]
+            return
+        chunks = []
+        try:
+            if surface is None:
+                results = simulation.stream(chunk_size)
+            else:
+                with stage("simulation.surface_lookup"):
+                    looked_up = surface.lookup(params, steps_per_run, num_runs, backend)
+                results = (
+                    looked_up.timesteps(start, start + chunk_size)
+                    for start in range(0, steps_per_run + 1, chunk_size)
+                )
+            for result in results:
+                chunks.append(self._label(result.freeze().to_pandas(), surface))
+                yield chunks[-1]
+            df = pd.concat(chunks).sort_values(["run", "timestep"], kind="stable")
+            df = self._label(df.reset_index(drop=True), surface)
+            df = self.put(key, df, persist=surface is None)
+        finally:
+            # Also runs when the consumer stops early, so waiters don't hang.
+            self._release(key, df)
+
+    def _surface_for(self, simulation, params, steps_per_run, num_runs, backend):
+        """
+        Return the surface to interpolate `simulation` from, or None to run it.
+        """
+        # The closed form is exact, and no slower than interpolating.
+        if self.surface is None or getattr(simulation, "is_analytic", False):
+            return None
+        if not self.surface.covers(params, steps_per_run, num_runs, backend):
+            return None
+        return self.surface
+
+    @staticmethod
+    def _key(params, steps_per_run, num_runs, backend, surface):
+        inputs = {
+            "params": params,
+            "steps_per_run": steps_per_run,
+            "num_runs": num_runs,
+            "backend": backend,
+        }
+        if surface is not None:
+            inputs["surface"] = os.path.realpath(surface.store.path)
+        return simulation_key(**inputs)
+
+    @staticmethod
+    def _label(df, surface):
+        df.attrs["interpolated"] = surface is not None
+        return df
+
+    def prewarm(self, requests):
+        """
+        Run each of `requests`, keyword arguments for `run`, in a background
+        thread. Sessions asking for one meanwhile wait for it rather than
+        running it again.
+        """
+
+        def warm():
+            for request in requests:
+                self.run(**request)
+
+        thread = threading.Thread(target=warm, name="cache-prewarm", daemon=True)
+        thread.start()
+        return thread
+
+
+C = load_constants()
+
+if C["response_surface"] is not None:
+    # Only import what reading a surface needs when one is configured.
+    from surface import ResponseSurface
+
+    # Relative paths are relative to `const.yaml`, like the app's modules.
+    surface = ResponseSurface.open(
+        os.path.join(os.path.dirname(__file__), C["response_surface"])
+    )
+else:
+    surface = None
+
+# Module state outlives Streamlit reruns, so every session shares this cache.
+SIMULATION_CACHE = SimulationCache(
+    max_bytes=C["cache_max_mb"] * 2**20, cache_dir=C["cache_dir"], surface=surface
+)
@@ -1,4 +1,5 @@
 from abc import ABC, abstractclassmethod
+import copy
 
 import altair as alt
 import numpy as np
@@ -6,14 +7,164 @@ import pandas as pd
 import streamlit as st
 
 from model import compute_stake_propensity
+from profiling import instrument
+
+
+BAND_LOWER, BAND_UPPER = "p5", "p95"
+# Min-max bucketing keeps two points per series per bucket, so one bucket
+# per pixel column draws the same line as every point would.
+POINTS_PER_PIXEL = 2
+
+
+def point_budget(width):
+    """
+    Return how many timesteps a chart `width` pixels wide can show.
+    """
+    return POINTS_PER_PIXEL * width
+
+
+def minmax_indices(values, max_points):
+    """
+    Pick about `max_points` rows of `values`, an `(n, num_series)` array,
+    that draw the same lines as every row.
+
+    Rows are split into equal buckets, and each bucket keeps the rows where
+    any series reaches its minimum or maximum, plus the first and last rows
+    overall. Every series is kept at the same rows, so series drawn together
+    stay aligned. Returns the kept row indices in order.
+    """
+    num_rows, num_series = values.shape
+    if num_rows <= max_points:
+        return np.arange(num_rows)
+    num_buckets = max(1, (max_points - 2) // (2 * num_series))
+    edges = np.linspace(0, num_rows, num_buckets + 1).astype(int)
+    bucket = np.repeat(np.arange(num_buckets), np.diff(edges))
+    kept = [np.array([0, num_rows - 1])]
+    for series in values.T:
+        # Sorted by bucket then value, bucket `b` spans `edges[b]` up to
+        # `edges[b + 1]`, so its first and last entries are its min and max.
+        order = np.lexsort((series, bucket))
+        kept += [order[edges[:-1]], order[edges[1:] - 1]]
+    return np.unique(np.concatenate(kept))
+
+
+class ChartData:
+    """
+    Every chart's input for one simulation result, reshaped once.
+
+    `wide` holds one row per timestep, with `perc_staked` and `staker_yield`
+    (and any ensemble bands) in percent. `long` holds one row per timestep
+    and cohort, with `dilution` (in percent) and `valuation`, ordered by
+    timestep so each timestep's rows are contiguous. Charts read row slices
+    of these frames instead of reshaping each row as it is added.
+
+    `downsample` thins both frames to a point budget for long or
+    fine-grained runs.
+    """
+
+    COHORTS = pd.CategoricalDtype(["unstaked", "staked"])
+    PERCENT_STATS = ["perc_staked", "staker_yield"]
+    COHORT_STATS = {"dilution": 100, "valuation": 1}
+
+    @instrument("chart.ChartData")
+    def __init__(self, df):
+        wide = {"timestep": df["timestep"].to_numpy()}
+        for col in df.columns:
+            if col.startswith(tuple(self.PERCENT_STATS)):
+                wide[col] = df[col].to_numpy() * 100
+        self.wide = pd.DataFrame(wide)
+
+        num_cohorts = len(self.COHORTS.categories)
+        long = {
+            "timestep": np.repeat(df["timestep"].to_numpy(), num_cohorts),
+            "cohort": pd.Categorical.from_codes(
+                np.tile(np.arange(num_cohorts), len(df)), dtype=self.COHORTS
+            ),
+        }
+        for stat, scale in self.COHORT_STATS.items():
+            for col in df.columns:
+                if not col.startswith(f"staked_{stat}"):
+                    continue
+                suffix = col[len(f"staked_{stat}") :]
+                cohort_cols = [
+                    f"{cohort}_{stat}{suffix}" for cohort in self.COHORTS.categories
+                ]
+                long[stat + suffix] = df[cohort_cols].to_numpy().ravel() * scale
+        self.long = pd.DataFrame(long)
+
+    @instrument("chart.ChartData.downsample")
+    def downsample(self, max_points):
+        """
+        Return a copy keeping about `max_points` timesteps, picked by
+        `minmax_indices`, in each of `wide` and `long`.
+
+        Every cohort is kept at the same timesteps. Row slices of the copy
+        index the kept timesteps.
+        """
+        data = copy.copy(self)
+        wide_values = self.wide.drop(columns="timestep").to_numpy()
+        data.wide = self.wide.iloc[minmax_indices(wide_values, max_points)]
+
+        # One row per timestep, holding every stat of every cohort.
+        num_cohorts = len(self.COHORTS.categories)
+        long_values = self.long.drop(columns=["timestep", "cohort"]).to_numpy()
+        long_values = long_values.reshape(-1, num_cohorts * long_values.shape[1])
+        kept = minmax_indices(long_values, max_points)
+        data.long = self.long.iloc[
+            (kept[:, None] * num_cohorts + np.arange(num_cohorts)).ravel()
+        ]
+        return data
+
+    def wide_rows(self, start=0, stop=None):
+        return self.wide.iloc[start:stop]
+
+    def long_rows(self, start=0, stop=None):
+        num_cohorts = len(self.COHORTS.categories)
+        stop = None if stop is None else stop * num_cohorts
+        return self.long.iloc[start * num_cohorts : stop]
 
 
 class AltairChart(ABC):
-    def __init__(self, chart, use_container_width=True):
+    def __init__(self, chart, data, use_container_width=True):
         self.chart = st.altair_chart(chart, use_container_width=use_container_width)
+        self.data = data
+
+    def add_rows(self, data, start=0, stop=None):
+        """
+        Append timesteps `start` through `stop - 1` of `data`, a `ChartData`.
+        """
+        self.chart.add_rows(self._rows(data, start, stop))
+
+    @staticmethod
+    def _rows(data, start=0, stop=None):
+        return data.wide_rows(start, stop)
+
+    @staticmethod
+    def _with_band(chart, df, y, title):
+        """
+        Layer a percentile band under `chart` when `df` holds ensemble results.
 
-    def add_rows(self, row):
-        self.chart.add_rows(row)
+        See `utils.summarize_ensemble` for the `<column>_p<p>` naming scheme.
+        """
+        lower, upper = f"{y}_{BAND_LOWER}", f"{y}_{BAND_UPPER}"
+        if lower not in df.columns:
+            return chart
+        band = chart.mark_area(opacity=0.3).encode(
+            y=alt.Y(lower, title=title), y2=upper
+        )
+        return alt.layer(band, chart)
+
+    @staticmethod
+    def _with_playback(chart, num_steps):
+        """
+        Let the browser step through timesteps with a slider, rather than
+        having the server stream rows in one at a time.
+        """
+        cutoff = alt.param(
+            value=num_steps - 1,
+            bind=alt.binding_range(min=0, max=num_steps - 1, step=1, name="Timestep "),
+        )
+        return chart.add_params(cutoff).transform_filter(alt.datum.timestep <= cutoff)
 
     @abstractclassmethod
     def build(cls):
@@ -21,17 +172,12 @@ class AltairChart(ABC):
 
 
 class PercStakedAltairChart(AltairChart):
-    def add_rows(self, row):
-        self.chart.add_rows(self._preprocess(row))
-
-    @classmethod
-    def _preprocess(cls, row):
-        return row.assign(perc_staked=row["perc_staked"] * 100)
-
     @classmethod
-    def build(cls, df, num_steps):
+    @instrument("chart.PercStakedAltairChart.build")
+    def build(cls, data, num_steps, stop=None, playback=False):
+        df = cls._rows(data, stop=stop)
         chart = (
-            alt.Chart(cls._preprocess(df))
+            alt.Chart(df)
             .mark_line()
             .encode(
                 x=alt.X(
@@ -45,23 +191,22 @@ class PercStakedAltairChart(AltairChart):
                     title="% Total SOL Staked",
                 ),
             )
-            .properties(title="% of Total SOL Staked Over Time")
         )
-        return cls(chart)
+        chart = cls._with_band(
+            chart, df, "perc_staked", "% Total SOL Staked"
+        ).properties(title="% of Total SOL Staked Over Time")
+        if playback:
+            chart = cls._with_playback(chart, num_steps)
+        return cls(chart, data)
 
 
 class StakerYieldAltairChart(AltairChart):
-    def add_rows(self, row):
-        self.chart.add_rows(self._preprocess(row))
-
-    @classmethod
-    def _preprocess(cls, row):
-        return row.assign(staker_yield=row["staker_yield"] * 100)
-
     @classmethod
-    def build(cls, df, num_steps):
+    @instrument("chart.StakerYieldAltairChart.build")
+    def build(cls, data, num_steps, stop=None, playback=False):
+        df = cls._rows(data, stop=stop)
         chart = (
-            alt.Chart(cls._preprocess(df))
+            alt.Chart(df)
             .mark_line()
             .encode(
                 x=alt.X(
@@ -73,55 +218,52 @@ class StakerYieldAltairChart(AltairChart):
                     "staker_yield", scale=alt.Scale(domain=(0, 20)), title="% Yield"
                 ),
             )
-            .properties(title="% Yield on Staked Tokens")
         )
-        return cls(chart)
+        chart = cls._with_band(chart, df, "staker_yield", "% Yield").properties(
+            title="% Yield on Staked Tokens"
+        )
+        if playback:
+            chart = cls._with_playback(chart, num_steps)
+        return cls(chart, data)
 
 
 class DilutionAltairChart(AltairChart):
-    def add_rows(self, row):
-        self.chart.add_rows(self._melt(row))
-
     @staticmethod
-    def _melt(df):
-        return (
-            df[["unstaked_dilution", "staked_dilution", "timestep"]]
-            .melt("timestep", var_name="cohort", value_name="dilution")
-            .assign(cohort=lambda df: df["cohort"].str.replace("_dilution", ""))
-            .assign(dilution=lambda df: df["dilution"] * 100)
-        )
+    def _rows(data, start=0, stop=None):
+        return data.long_rows(start, stop)
 
     @classmethod
-    def build(cls, df, num_steps):
+    @instrument("chart.DilutionAltairChart.build")
+    def build(cls, data, num_steps, stop=None, playback=False):
+        df = cls._rows(data, stop=stop)
         chart = (
-            alt.Chart(cls._melt(df))
+            alt.Chart(df)
             .mark_line()
             .encode(
                 x=alt.X("timestep", scale=alt.Scale(domain=(0, num_steps - 1))),
                 y=alt.Y("dilution", title="% Dilution"),
                 color="cohort",
             )
-            .properties(title="Token Dilution Over Time")
         )
-        return cls(chart)
+        chart = cls._with_band(chart, df, "dilution", "% Dilution").properties(
+            title="Token Dilution Over Time"
+        )
+        if playback:
+            chart = cls._with_playback(chart, num_steps)
+        return cls(chart, data)
 
 
 class ValuationAltairChart(AltairChart):
-    def add_rows(self, row):
-        self.chart.add_rows(self._melt(row))
-
     @staticmethod
-    def _melt(df):
-        return (
-            df[["unstaked_valuation", "staked_valuation", "timestep"]]
-            .melt("timestep", var_name="cohort", value_name="valuation")
-            .assign(cohort=lambda df: df["cohort"].str.replace("_valuation", ""))
-        )
+    def _rows(data, start=0, stop=None):
+        return data.long_rows(start, stop)
 
     @classmethod
-    def build(cls, df, num_steps, initial_valuation):
+    @instrument("chart.ValuationAltairChart.build")
+    def build(cls, data, num_steps, initial_valuation, stop=None, playback=False):
+        df = cls._rows(data, stop=stop)
         chart = (
-            alt.Chart(cls._melt(df))
+            alt.Chart(df)
             .mark_line()
             .encode(
                 x=alt.X(
@@ -132,41 +274,15 @@ class ValuationAltairChart(AltairChart):
                 y=alt.Y("valuation", title="U.S. Dollars ($)"),
                 color="cohort",
             )
-            .properties(
-                title={
-                    "text": "Capital Valuation Over Time",
-                }
-            )
         )
-        return cls(chart)
-
-
-class DilutionAltairChart(AltairChart):
-    def add_rows(self, row):
-        self.chart.add_rows(self._melt(row))
-
-    @staticmethod
-    def _melt(df):
-        return (
-            df[["unstaked_dilution", "staked_dilution", "timestep"]]
-            .melt("timestep", var_name="cohort", value_name="dilution")
-            .assign(cohort=lambda df: df["cohort"].str.replace("_dilution", ""))
-            .assign(dilution=lambda df: df["dilution"] * 100)
-        )
-
-    @classmethod
-    def build(cls, df, num_steps):
-        chart = (
-            alt.Chart(cls._melt(df))
-            .mark_line()
-            .encode(
-                x=alt.X("timestep", scale=alt.Scale(domain=(0, num_steps - 1))),
-                y=alt.Y("dilution", title="% Dilution"),
-                color="cohort",
-            )
-            .properties(title="Token Dilution Over Time")
+        chart = cls._with_band(chart, df, "valuation", "U.S. Dollars ($)").properties(
+            title={
+                "text": "Capital Valuation Over Time",
+            }
         )
-        return cls(chart)
+        if playback:
+            chart = cls._with_playback(chart, num_steps)
+        return cls(chart, data)
 
 
 class StakePropensityChart:
@@ -174,16 +290,16 @@ class StakePropensityChart:
     YIELD_VALS = np.linspace(0, 0.16, 101)
 
     @classmethod
+    @instrument("chart.StakePropensityChart.build")
     def build(cls, yield_location, yield_scale):
         df = pd.DataFrame(
             {
                 "previous_yield": cls.YIELD_VALS * 100,
                 "current_behavior": "Staked",
                 "policy": "proactive",
-                "maintain_behavior_propensity": [
-                    compute_stake_propensity(prev_yield, yield_location, yield_scale)
-                    for prev_yield in cls.YIELD_VALS
-                ],
+                "maintain_behavior_propensity": compute_stake_propensity(
+                    cls.YIELD_VALS, yield_location, yield_scale
+                ),
             }
         ).pipe(
             lambda df: pd.concat(
@@ -0,0 +1,97 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+from cache import SIMULATION_CACHE
+from profiling import activated, active_profiler
+from utils import load_constants
+
+
+class SimulationJob:
+    """
+    A simulation submitted to a `SimulationExecutor`.
+
+    `future` resolves to the simulation's DataFrame, or raises
+    `SimulationCancelled` if the job was cancelled mid-run. `progress` is the
+    fraction of timesteps the engine has finished.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.progress = 0.0
+        self.cancelled = threading.Event()
+        self.future = None
+
+    def _report(self, frac_complete):
+        self.progress = frac_complete
+
+    def cancel(self):
+        """
+        Stop the job at its next timestep, or before it starts.
+        """
+        self.cancelled.set()
+        self.future.cancel()
+
+    def done(self):
+        return self.future.done()
+
+    def result(self, timeout=None):
+        return self.future.result(timeout)
+
+
+class SimulationExecutor:
+    """
+    Run simulations through `cache` on background threads.
+
+    Callers keep the returned `SimulationJob` and cancel it once its inputs
+    are superseded, so stale runs stop between timesteps instead of running
+    to completion.
+    """
+
+    def __init__(self, cache, max_workers=None):
+        self.cache = cache
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix="simulation")
+
+    def submit(self, params, steps_per_run, num_runs=1, backend="cadcad"):
+        """
+        Start `cache.run` with these arguments, and return its job.
+
+        The job reports to the profiler active on the calling thread, if any.
+        """
+        request = {
+            "params": params,
+            "steps_per_run": steps_per_run,
+            "num_runs": num_runs,
+            "backend": backend,
+        }
+        job = SimulationJob(request)
+        job.future = self._pool.submit(
+            self._run,
+            job,
+            active_profiler(),
+            params,
+            steps_per_run,
+            num_runs,
+            backend,
+        )
+        return job
+
+    def _run(self, job, profiler, params, steps_per_run, num_runs, backend):
+        with activated(profiler):
+            df = self.cache.run(
+                params,
+                steps_per_run,
+                num_runs,
+                backend,
+                progress=job._report,
+                cancelled=job.cancelled,
+            )
+        job._report(1.0)
+        return df
+
+
+C = load_constants()
+
+# Shared by every session, like `SIMULATION_CACHE`.
+SIMULATION_EXECUTOR = SimulationExecutor(
+    SIMULATION_CACHE, max_workers=C["simulation_workers"]
+)
@@ -1,41 +1,55 @@
+from contextlib import closing, nullcontext
 import os
 import time
 
 import streamlit as st
 
 from chart import (
+    ChartData,
     PercStakedAltairChart,
     StakerYieldAltairChart,
     DilutionAltairChart,
     ValuationAltairChart,
+    point_budget,
 )
+from cache import SIMULATION_CACHE
 from description import description
-from model import (
-    compute_staker_yield,
-    compute_unstaked_dilution,
-    compute_staked_dilution,
-    p_staker_behavior,
-    s_inflation,
-    s_sol_staked,
-    s_staker_yield,
-    s_total_supply,
-    s_perc_staked,
-    s_unstaked_dilution,
-    s_staked_dilution,
-    s_unstaked_valuation,
-    s_staked_valuation,
-    constant_behavior_policy,
-    proactive_behavior_policy,
-)
+from executor import SIMULATION_EXECUTOR
+from model import BEHAVIOR2POLICY, TIMESTEPS
+from profiling import Profiler
 from stats import stat2meta
-from utils import CadCadSimulationBuilder, load_constants
+from utils import (
+    default_params,
+    load_constants,
+    resample_yearly,
+    summarize_ensemble,
+)
 
 
 C = CONSTANTS = load_constants()
-BEHAVIOR2POLICY = {
-    "Constant": constant_behavior_policy,
-    "Proactive": proactive_behavior_policy,
-}
+
+profiler = Profiler(capture=C["profile_capture"]) if C["debug"] else None
+
+
+@st.cache_resource
+def prewarm():
+    # Every session starts on the defaults, so have them ready. Streamlit runs
+    # this once per server, on its first session.
+    params = default_params()
+    return SIMULATION_CACHE.prewarm(
+        [
+            {
+                "params": params,
+                "steps_per_run": C["total_years"] * params["steps_per_year"],
+                "num_runs": C["num_runs"],
+                "backend": C["backend"],
+            }
+        ]
+    )
+
+
+if C["cache_prewarm"]:
+    prewarm()
 
 # Define sidebar
 
@@ -50,9 +64,9 @@ progress_text = st.sidebar.text("0.0% Complete")
 
 st.sidebar.markdown("## Behavioral Policies")
 
-unstaked_policy = st.sidebar.selectbox("Unstaked Policy", ("Constant", "Proactive"))
+unstaked_policy = st.sidebar.selectbox("Unstaked Policy", list(BEHAVIOR2POLICY))
 
-staked_policy = st.sidebar.selectbox("Staked Policy", ("Constant", "Proactive"))
+staked_policy = st.sidebar.selectbox("Staked Policy", list(BEHAVIOR2POLICY))
 
 st.sidebar.markdown("## Proactive Policy Parameters")
 
@@ -60,6 +74,13 @@ yield_location = st.sidebar.slider(
     "Yield Location", 0.0, 0.1, C["yield_location"], 0.01
 )
 yield_scale = st.sidebar.slider("Yield Scale", 10.0, 50.0, C["yield_scale"], 10.0)
+num_runs = st.sidebar.select_slider(
+    "Number of runs", (1, 10, 100, 1000, 10000), C["num_runs"]
+)
+seed = st.sidebar.number_input("Random seed", 0, value=C["seed"], step=1)
+timestep = st.sidebar.selectbox(
+    "Timestep", list(TIMESTEPS), list(TIMESTEPS).index(C["timestep"])
+)
 
 st.sidebar.markdown("## Economic parameters")
 
@@ -146,58 +167,37 @@ if long_term_infl_rate > base_infl_rate:
 
 TOTAL_YEARS = C["total_years"]
 INITIAL_VALUATION = C["initial_valuation"]
+CHART_WIDTH = C["chart_width"]
+
+params = {
+    "unstaked_policy": unstaked_policy,
+    "staked_policy": staked_policy,
+    "yield_location": yield_location,
+    "yield_scale": yield_scale,
+    "init_supply": init_supply,
+    "init_perc_staked": init_perc_staked,
+    "base_infl_rate": base_infl_rate,
+    "dis_infl_rate": dis_infl_rate,
+    "long_term_infl_rate": long_term_infl_rate,
+    "vdtr_comm_perc": vdtr_comm_perc,
+    "vdtr_uptime_freq": vdtr_uptime_freq,
+    "initial_valuation": INITIAL_VALUATION,
+    "seed": seed,
+    "steps_per_year": TIMESTEPS[timestep],
+}
 
-simulation = CadCadSimulationBuilder.build(
-    system_params={
-        "base_infl_rate": base_infl_rate,
-        "dis_infl_rate": dis_infl_rate,
-        "long_term_infl_rate": long_term_infl_rate,
-        "vdtr_comm_perc": vdtr_comm_perc,
-        "vdtr_uptime_freq": vdtr_uptime_freq,
-        "initial_valuation": INITIAL_VALUATION,
-        "unstaked_policy": BEHAVIOR2POLICY[unstaked_policy],
-        "staked_policy": BEHAVIOR2POLICY[staked_policy],
-        "yield_location": yield_location,
-        "yield_scale": yield_scale,
-    },
-    initial_state={
-        "inflation": base_infl_rate,
-        "perc_staked": init_perc_staked,
-        "sol_staked": init_perc_staked * init_supply,
-        "total_supply": init_supply,
-        "staker_yield": compute_staker_yield(
-            base_infl_rate, vdtr_uptime_freq, vdtr_comm_perc, init_perc_staked
-        ),
-        "unstaked_dilution": compute_unstaked_dilution(base_infl_rate),
-        "staked_dilution": compute_staked_dilution(base_infl_rate, init_perc_staked),
-        "unstaked_valuation": INITIAL_VALUATION,
-        "staked_valuation": INITIAL_VALUATION,
-    },
-    partial_state_update_blocks=[
-        {
-            "policies": {"staker_behavior": p_staker_behavior},
-            "variables": {
-                "sol_staked": s_sol_staked,
-                "perc_staked": s_perc_staked,
-                "total_supply": s_total_supply,
-                "inflation": s_inflation,
-                "staker_yield": s_staker_yield,
-                "unstaked_dilution": s_unstaked_dilution,
-                "staked_dilution": s_staked_dilution,
-                "unstaked_valuation": s_unstaked_valuation,
-                "staked_valuation": s_staked_valuation,
-            },
-        }
-    ],
-    steps_per_run=TOTAL_YEARS,
-)
+steps_per_year = TIMESTEPS[timestep]
+num_steps = TOTAL_YEARS + 1
 
-df = simulation.run()
-assert df.index.tolist() == df["timestep"].tolist()
 
-# Simulation params
+def summarize(df):
+    # Chart and report yearly, whatever the timestep.
+    df = resample_yearly(df, steps_per_year)
+    if num_runs > 1:
+        # Reduce the ensemble to its mean, with percentile bands for the charts.
+        df = summarize_ensemble(df)
+    return df.reset_index(drop=True)
 
-num_steps = len(df)
 
 # Define description
 
@@ -210,19 +210,17 @@ with st.expander("See description"):
 st.markdown("## Results")
 
 # Define layout
+source_note = st.empty()
 stats_dboard = st.empty()
 primary_plot_container = st.container()
 secondary_plot_container = st.container()
 
 # Simulate
 
-prevrow = None
 
-for i in range(num_steps if run_simulation else 1):
-    row = df.iloc[[i]]
-    # Update stats
+def update_stats(row, prevrow):
     cols = stats_dboard.columns(len(stat2meta))
-    for ((stat, meta), col) in zip(stat2meta.items(), cols):
+    for (stat, meta), col in zip(stat2meta.items(), cols):
         if prevrow is not None and meta["delta_func"] is not None:
             delta = meta["delta_func"](row[stat].item(), prevrow[stat].item())
             delta = meta["format_func"](delta)
@@ -230,29 +228,137 @@ for i in range(num_steps if run_simulation else 1):
             delta = None
         with col:
             st.metric(
-                label=meta["label"], value=meta["format_func"](row[stat]), delta=delta
+                label=meta["label"],
+                value=meta["format_func"](row[stat].item()),
+                delta=delta,
             )
-    # Update plots
-    if i == 0:
-        with primary_plot_container:
-            perc_staked_chart = PercStakedAltairChart.build(row, num_steps)
-            staker_yield_chart = StakerYieldAltairChart.build(row, num_steps)
-        col1, col2 = secondary_plot_container.columns(2)
-        with col1:
-            dilution_chart = DilutionAltairChart.build(row, num_steps)
-        with col2:
-            valuation_chart = ValuationAltairChart.build(
-                row, num_steps, INITIAL_VALUATION
-            )
-    else:
-        perc_staked_chart.add_rows(row)
-        staker_yield_chart.add_rows(row)
-        dilution_chart.add_rows(row)
-        valuation_chart.add_rows(row)
-    # Finally
+
+
+def note_source(df):
+    if df.attrs.get("interpolated"):
+        source_note.caption(
+            "Interpolated from a precomputed response surface, so it only "
+            "approximates a simulation with this seed."
+        )
+
+
+def downsample(data, width):
+    # Give each chunk its share of the points a chart this wide can show.
+    return data.downsample(max(2, point_budget(width) * len(data.wide) // num_steps))
+
+
+def build_charts(data, stop=None, playback=False):
+    """
+    Return each chart with its width in pixels.
+    """
+    primary_width, secondary_width = CHART_WIDTH, CHART_WIDTH // 2
+    primary_data = downsample(data, primary_width)
+    secondary_data = downsample(data, secondary_width)
+    with primary_plot_container:
+        perc_staked_chart = PercStakedAltairChart.build(
+            primary_data, num_steps, stop, playback
+        )
+        staker_yield_chart = StakerYieldAltairChart.build(
+            primary_data, num_steps, stop, playback
+        )
+    col1, col2 = secondary_plot_container.columns(2)
+    with col1:
+        dilution_chart = DilutionAltairChart.build(
+            secondary_data, num_steps, stop, playback
+        )
+    with col2:
+        valuation_chart = ValuationAltairChart.build(
+            secondary_data, num_steps, INITIAL_VALUATION, stop, playback
+        )
+    return [
+        (perc_staked_chart, primary_width),
+        (staker_yield_chart, primary_width),
+        (dilution_chart, secondary_width),
+        (valuation_chart, secondary_width),
+    ]
+
+
+request = {
+    "params": params,
+    "steps_per_run": TOTAL_YEARS * steps_per_year,
+    "num_runs": num_runs,
+    "backend": C["backend"],
+}
+
+# Profile this script run alone. Streamlit stops a run early, by raising
+# inside it, whenever the sliders move, so the profiler must stop on the way
+# out as well.
+with profiler or nullcontext():
+    # A job started by an earlier rerun keeps running in the background. Stop it
+    # once the sliders move on, so stale runs don't hold a worker.
+    job = st.session_state.get("simulation_job")
+    if job is not None and job.request != request:
+        job.cancel()
+        del st.session_state["simulation_job"]
+        job = None
+
     if run_simulation:
-        frac_complete = (i + 1) / num_steps
-        time.sleep(C["speed"])
-        progress_bar.progress(frac_complete)
-        progress_text.text(f"{(frac_complete * 100):.2f}% Complete")
-        prevrow = row
+        # Compute the whole run on a background job before playing it back,
+        # so sessions waiting on the same result aren't held up by the
+        # playback. Pressing Run again with the same inputs picks up the job
+        # already running.
+        if job is None:
+            job = SIMULATION_EXECUTOR.submit(**request)
+            st.session_state["simulation_job"] = job
+        while not job.done():
+            progress_bar.progress(job.progress)
+            progress_text.text(f"{(job.progress * 100):.2f}% Complete")
+            time.sleep(0.1)
+        df = job.result()
+        note_source(df)
+        df = summarize(df)
+        if C["playback"] == "client":
+            # Send every timestep in a single render, and let the browser step
+            # through them, instead of holding this script thread for the
+            # whole animation.
+            update_stats(df.iloc[[-1]], df.iloc[[-2]] if num_steps > 1 else None)
+            build_charts(ChartData(df), playback=True)
+            progress_bar.progress(1.0)
+            progress_text.text("100.00% Complete")
+        else:
+            charts = None
+            prevrow = None
+            for i in range(len(df)):
+                row = df.iloc[[i]]
+                chart_data = ChartData(row)
+                if charts is None:
+                    charts = build_charts(chart_data)
+                else:
+                    for chart, width in charts:
+                        chart.add_rows(downsample(chart_data, width))
+                update_stats(row, prevrow)
+                frac_complete = (row["timestep"].item() + 1) / num_steps
+                time.sleep(C["speed"])
+                progress_bar.progress(frac_complete)
+                progress_text.text(f"{(frac_complete * 100):.2f}% Complete")
+                prevrow = row
+    else:
+        # Without a run, only the initial state is needed, so take the first
+        # year's chunk and close the stream, which releases the run it claimed
+        # in the cache now rather than whenever the generator is collected.
+        with closing(
+            SIMULATION_CACHE.stream(
+                params,
+                steps_per_run=TOTAL_YEARS * steps_per_year,
+                num_runs=num_runs,
+                backend=C["backend"],
+                chunk_size=steps_per_year,
+            )
+        ) as chunks:
+            chunk = next(chunks)
+        note_source(chunk)
+        chunk = summarize(chunk)
+        build_charts(ChartData(chunk))
+        update_stats(chunk.iloc[[0]], None)
+
+if profiler is not None:
+    with st.expander("Debug"):
+        st.json(profiler.report())
+        st.download_button("Download profile", profiler.to_json(), "profile.json")
+        if profiler.capture is not None:
+            st.text(profiler.captured())
@@ -1,36 +1,142 @@
-import math
-from scipy.stats import beta
+import os
 
+import numpy as np
 
+from profiling import instrument
+
+
+# numba costs more to import and compile than it saves at the app's array
+# sizes, so it is opt-in.
+if os.environ.get("SOLANA_JIT"):
+    import numba
+else:
+    numba = None
+
+
+def elementwise(func):
+    """
+    Turn `func`, written for scalars in terms of NumPy ufuncs, into a
+    broadcasting ufunc compiled by numba, if the `SOLANA_JIT` environment
+    variable is set.
+
+    The ufunc is compiled for float32 and float64 when it is defined, so
+    concurrent first calls never compile it again. Otherwise, `func` is
+    returned as is: its NumPy operations already broadcast over scalars and
+    arrays alike.
+    """
+    if numba is None:
+        return func
+    num_args = func.__code__.co_argcount
+    signatures = [
+        f"{dtype}({', '.join([dtype] * num_args)})" for dtype in ("float32", "float64")
+    ]
+    return numba.vectorize(signatures, cache=True)(func)
+
+
+@elementwise
 def sigmoid(x):
-    return 1 / (1 + math.exp(-x))
+    return 1 / (1 + np.exp(-x))
 
 
+@elementwise
 def compute_staker_yield(inflation, uptime, commission, perc_staked):
     return inflation * uptime * (1 - commission) / perc_staked
 
 
-def compute_inflation_rate(base_rate, grow_rate, ltr, timestep):
+@elementwise
+def compute_inflation_rate(base_rate, grow_rate, ltr, year):
     """
-    Compute the % of token inflation that will occur over upcoming timestep.
+    Compute the % of token inflation that will occur over the year starting
+    at `year`, which need not be whole.
 
     If we start with 100 tokens, and inflation is 7%, then next year
     the system will have 107 tokens, where new tokens are distributed
     to stakers.
     """
-    return max(base_rate * (1 + grow_rate) ** timestep, ltr)
+    return np.maximum(base_rate * (1 + grow_rate) ** year, ltr)
+
+
+def compute_step_rate(annual_rate, steps_per_year):
+    """
+    Compound an annual rate down to the rate over one of `steps_per_year`
+    equal timesteps.
+    """
+    if np.all(steps_per_year == 1):
+        return annual_rate
+    return np.expm1(np.log1p(annual_rate) / steps_per_year)
+
+
+def compute_annual_rate(step_rate, steps_per_year):
+    """
+    Inverse of `compute_step_rate`.
+    """
+    if np.all(steps_per_year == 1):
+        return step_rate
+    return np.expm1(np.log1p(step_rate) * steps_per_year)
+
+
+def compute_step_keep_frac(keep_strat_frac, steps_per_year):
+    """
+    Rescale the fraction of a cohort keeping its behavior over a year, as
+    policies give it, to the fraction keeping it over one timestep.
+    """
+    if np.all(steps_per_year == 1):
+        return keep_strat_frac
+    return keep_strat_frac ** (1 / steps_per_year)
+
+
+def draw_keep_fracs(params, previous_yield, timestep, held):
+    """
+    Return the fractions of the staked and unstaked cohorts keeping their
+    behavior over `timestep`.
+
+    Policies give the fraction over a whole year, so it is drawn at the
+    first timestep of each year, stored in `held`, and spread over that
+    year's timesteps. Drawing afresh every timestep would make the year's
+    fraction the geometric mean of many draws, narrowing and lowering it as
+    timesteps get finer.
+    """
+    steps_per_year = params["steps_per_year"]
+    if not held or (timestep - 1) % steps_per_year == 0:
+        for behavior in ("staked", "unstaked"):
+            held[behavior] = params[f"{behavior}_policy"](
+                behavior,
+                previous_yield,
+                params["yield_location"],
+                params["yield_scale"],
+                params["policy_rng"],
+            )
+    return (
+        compute_step_keep_frac(held["staked"], steps_per_year),
+        compute_step_keep_frac(held["unstaked"], steps_per_year),
+    )
 
 
+@elementwise
 def compute_unstaked_dilution(inflation):
     return -inflation / (1 + inflation)
 
 
+@elementwise
 def compute_staked_dilution(inflation, perc_staked):
     numer = (inflation / perc_staked) - inflation
     denom = 1 + inflation
     return numer / denom
 
 
+def unwrap_params(params):
+    """
+    Return the params dict cadCAD passes to policies and state updates.
+
+    cadCAD before 0.5 wraps it in a one-element list, and later versions pass
+    the dict itself.
+    """
+    if isinstance(params, dict):
+        return params
+    (params,) = params
+    return params
+
+
 def p_staker_behavior(params, substep, state_history, previous_state):
     """
     Compute the % of total SOL that will be staked in upcoming timestep.
@@ -38,10 +144,11 @@ def p_staker_behavior(params, substep, state_history, previous_state):
     New SOL issued via inflation is awarded to stakers, and is automatically
     restaked, *subject to the stakers withdrawing this stake.*
     """
-    (params,) = params  # I don't know why this is necessary.
+    params = unwrap_params(params)
     base_rate = params["base_infl_rate"]
     grow_rate = params["dis_infl_rate"]
     ltr = params["long_term_infl_rate"]
+    steps_per_year = params["steps_per_year"]
     timestep = previous_state["timestep"] + 1
 
     # Update parameters given previous timestep.
@@ -57,24 +164,22 @@ def p_staker_behavior(params, substep, state_history, previous_state):
     award = previous_state["total_supply"] * inflation_prev
 
     # Compute definite parameters for upcoming timestep.
-    inflation = compute_inflation_rate(base_rate, grow_rate, ltr, timestep)
+    inflation = compute_step_rate(
+        compute_inflation_rate(base_rate, grow_rate, ltr, timestep / steps_per_year),
+        steps_per_year,
+    )
 
     # Compute tentative parameters for upcoming timestep.
     _sol_staked = previous_state["sol_staked"] + award
     _sol_unstaked = total_supply - _sol_staked
 
-    # Update staked and unstaked behaviors.
-    staked_keep_strat_frac = params["staked_policy"](
-        "staked",
+    # Update staked and unstaked behaviors. Runs execute one after another,
+    # each starting on a year boundary, so they can share the held draws.
+    staked_keep_strat_frac, unstaked_keep_strat_frac = draw_keep_fracs(
+        params,
         previous_state["staker_yield"],
-        params["yield_location"],
-        params["yield_scale"],
-    )
-    unstaked_keep_strat_frac = params["unstaked_policy"](
-        "unstaked",
-        previous_state["staker_yield"],
-        params["yield_location"],
-        params["yield_scale"],
+        timestep,
+        params.setdefault("held_keep_fracs", {}),
     )
     sol_staked = (
         staked_keep_strat_frac * _sol_staked
@@ -111,10 +216,10 @@ def s_staker_yield(params, substep, state_history, previous_state, policy_input)
     """
     Update the staker yield.
     """
-    (params,) = params  # I don't know why this is necessary.
+    params = unwrap_params(params)
     commission = params["vdtr_comm_perc"]
     uptime = params["vdtr_uptime_freq"]
-    inflation = policy_input["inflation"]
+    inflation = compute_annual_rate(policy_input["inflation"], params["steps_per_year"])
     perc_staked = policy_input["perc_staked"]
 
     staker_yield = compute_staker_yield(inflation, uptime, commission, perc_staked)
@@ -145,6 +250,7 @@ def s_staked_valuation(params, substep, state_history, previous_state, policy_in
     return "staked_valuation", policy_input["staked_valuation"]
 
 
+@instrument("policy.constant")
 def constant_behavior_policy(*args, **kwargs):
     """
     There are two behaviors in the network: to be staked or unstaked.
@@ -155,21 +261,447 @@ def constant_behavior_policy(*args, **kwargs):
     return 1
 
 
+@elementwise
 def compute_stake_propensity(previous_yield, yield_location, yield_scale):
     return sigmoid(yield_scale * (previous_yield - yield_location))
 
 
-def proactive_behavior_policy(behavior, previous_yield, yield_location, yield_scale):
+@instrument("policy.proactive")
+def proactive_behavior_policy(
+    behavior, previous_yield, yield_location, yield_scale, rng=None
+):
     """
     There are two behaviors in the network: to be staked or unstaked.
 
     This policy computes the probability that a given member maintains
     their current behavior.
+
+    The probability is a beta variate drawn from `rng`, a
+    `numpy.random.Generator`, so seeding `rng` reproduces it. Without `rng`,
+    a fresh, unseeded generator is used.
     """
+    if rng is None:
+        rng = np.random.default_rng()
     stake_propensity = compute_stake_propensity(
         previous_yield, yield_location, yield_scale
     )
     keep_strat_frac = stake_propensity if behavior == "staked" else 1 - stake_propensity
-    return beta.rvs(
-        (keep_strat_frac * 100) + 1, ((1 - keep_strat_frac) * 100) + 1, size=1
-    ).item()
+    return rng.beta((keep_strat_frac * 100) + 1, ((1 - keep_strat_frac) * 100) + 1)
+
+
+def per_run(val):
+    """
+    Shape a param or state variable, a scalar or one value per run, as a
+    column that broadcasts against `(num_runs, ...)` arrays.
+    """
+    return np.reshape(np.asarray(val, dtype=np.float64), (-1, 1))
+
+
+def iter_cohort_simulation(params, initial_state, steps_per_run, num_runs, rebalance):
+    """
+    Advance the staker model for many runs at once, one timestep at a time,
+    leaving who stakes to `rebalance`.
+
+    Does the bookkeeping every engine shares: inflation, supply, awards,
+    valuations and the rates that follow from them. Each timestep,
+    `rebalance(prev, timestep, total_supply, award)` returns the SOL staked at
+    the end of `timestep`, given the previous state, the new total supply and
+    the award paid on the previous stake. Yields the state at each timestep, starting with the
+    initial state, as a dict mapping each state variable to a float64 array
+    of shape `(num_runs,)`. Nothing is kept between timesteps.
+
+    When `params["steady_state_tol"]` is set, stops early, once
+    `is_steady_state` has held for every run at each timestep of the last
+    `params["steady_state_window"]` years. A single quiet step proves little
+    under a random policy, whose draws can land close together by chance.
+    The rest of the horizon then follows from `extrapolate_steady_state`.
+    """
+    base_rate = params["base_infl_rate"]
+    grow_rate = params["dis_infl_rate"]
+    ltr = params["long_term_infl_rate"]
+    commission = params["vdtr_comm_perc"]
+    uptime = params["vdtr_uptime_freq"]
+    steps_per_year = params["steps_per_year"]
+    tolerance = params.get("steady_state_tol")
+    steady_steps = 0
+
+    state = {
+        var: np.broadcast_to(np.asarray(val, dtype=np.float64), (num_runs,))
+        for var, val in initial_state.items()
+    }
+    yield state
+
+    for timestep in range(1, steps_per_run + 1):
+        prev = state
+
+        # Update parameters given previous timestep.
+        unstaked_dilution_prev = compute_unstaked_dilution(prev["inflation"])
+        unstaked_valuation = (1 + unstaked_dilution_prev) * prev["unstaked_valuation"]
+        staked_valuation = (
+            1 + compute_staked_dilution(prev["inflation"], prev["perc_staked"])
+        ) * prev["staked_valuation"]
+        total_supply = prev["total_supply"] * (1 + prev["inflation"])
+        award = prev["total_supply"] * prev["inflation"]
+
+        # Compute definite parameters for upcoming timestep.
+        annual_inflation = compute_inflation_rate(
+            base_rate, grow_rate, ltr, timestep / steps_per_year
+        )
+        inflation = compute_step_rate(annual_inflation, steps_per_year)
+
+        sol_staked = rebalance(prev, timestep, total_supply, award)
+
+        # Update definite parameters for current timestep.
+        perc_staked = sol_staked / total_supply
+
+        state = {
+            "sol_staked": sol_staked,
+            "perc_staked": perc_staked,
+            "total_supply": total_supply,
+            "inflation": inflation,
+            "staker_yield": compute_staker_yield(
+                annual_inflation, uptime, commission, perc_staked
+            ),
+            "unstaked_dilution": compute_unstaked_dilution(inflation),
+            "staked_dilution": compute_staked_dilution(inflation, perc_staked),
+            "unstaked_valuation": unstaked_valuation,
+            "staked_valuation": staked_valuation,
+        }
+        yield state
+        if tolerance is not None:
+            if is_steady_state(
+                prev,
+                state,
+                base_rate,
+                grow_rate,
+                ltr,
+                timestep,
+                steps_per_year,
+                tolerance,
+            ):
+                steady_steps += 1
+            else:
+                steady_steps = 0
+            if steady_steps >= params["steady_state_window"] * steps_per_year:
+                return
+
+
+def iter_vectorized_simulation(params, initial_state, steps_per_run, num_runs):
+    """
+    Advance the staker model for many runs at once, one timestep at a time.
+
+    Mirrors `p_staker_behavior` and the `s_*` state updates, but holds each
+    state variable as an array over runs instead of building one dict per run
+    per timestep. Yields as `iter_cohort_simulation` does, and stops early in
+    the same way.
+    """
+    held = {}
+
+    def rebalance(prev, timestep, total_supply, award):
+        # Compute tentative parameters for upcoming timestep.
+        _sol_staked = prev["sol_staked"] + award
+        _sol_unstaked = total_supply - _sol_staked
+
+        # Update staked and unstaked behaviors.
+        staked_keep_strat_frac, unstaked_keep_strat_frac = draw_keep_fracs(
+            params, prev["staker_yield"], timestep, held
+        )
+        return (
+            staked_keep_strat_frac * _sol_staked
+            + (1 - unstaked_keep_strat_frac) * _sol_unstaked
+        )
+
+    return iter_cohort_simulation(
+        params, initial_state, steps_per_run, num_runs, rebalance
+    )
+
+
+def constant_agent_policy(behavior, stake_propensity):
+    """
+    Agent-level `constant_behavior_policy`: every holder keeps their current
+    behavior.
+    """
+    return 1
+
+
+def proactive_agent_policy(behavior, stake_propensity):
+    """
+    Agent-level `proactive_behavior_policy`.
+
+    Returns each holder's probability of keeping their current behavior: the
+    mean of the beta variate the cohort policy draws, so with identical
+    holders the expected flows match the cohort model's.
+    """
+    keep_strat_frac = stake_propensity if behavior == "staked" else 1 - stake_propensity
+    return (keep_strat_frac * 100 + 1) / 102
+
+
+AGENT_POLICIES = {
+    constant_behavior_policy: constant_agent_policy,
+    proactive_behavior_policy: proactive_agent_policy,
+}
+
+
+def iter_agent_simulation(params, initial_state, steps_per_run, num_runs):
+    """
+    Advance the staker model with `params["num_agents"]` individual holders
+    per run, one timestep at a time.
+
+    Each holder has their own balance, drawn log-normally with
+    `agent_balance_sigma`, and their own stake propensity sigmoid: a yield
+    threshold drawn normally around `yield_location` with
+    `agent_yield_location_sd`, and a scale drawn log-normally around
+    `yield_scale` with `agent_yield_scale_sd`. Every timestep, awards are
+    restaked pro rata by staked holders, then each holder independently keeps
+    or switches behavior with the probability given by the agent-level
+    counterpart, in `AGENT_POLICIES`, of their cohort's policy.
+
+    Holders are held as `(num_runs, num_agents)` arrays and updated with
+    masks. Yields the aggregate state at each timestep, as
+    `iter_cohort_simulation` does, and stops early in the same way.
+    """
+    steps_per_year = params["steps_per_year"]
+    staked_policy = AGENT_POLICIES[params["staked_policy"]]
+    unstaked_policy = AGENT_POLICIES[params["unstaked_policy"]]
+    rng = params["policy_rng"]
+    shape = (num_runs, int(params["num_agents"]))
+
+    # Draw holders, then rescale balances so each cohort holds its initial
+    # share of supply.
+    staked = rng.random(shape) < per_run(initial_state["perc_staked"])
+    balance = rng.lognormal(0, params["agent_balance_sigma"], shape)
+    staked_total = np.sum(balance, axis=1, where=staked, keepdims=True)
+    unstaked_total = np.sum(balance, axis=1, where=~staked, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        balance *= np.where(
+            staked,
+            per_run(initial_state["sol_staked"]) / staked_total,
+            per_run(initial_state["total_supply"] - initial_state["sol_staked"])
+            / unstaked_total,
+        )
+    location = rng.normal(
+        per_run(params["yield_location"]), params["agent_yield_location_sd"], shape
+    )
+    scale_sd = params["agent_yield_scale_sd"]
+    scale = per_run(params["yield_scale"]) * rng.lognormal(
+        -(scale_sd**2) / 2, scale_sd, shape
+    )
+
+    def rebalance(prev, timestep, total_supply, award):
+        nonlocal balance, staked
+
+        # Restake awards pro rata.
+        balance *= np.where(staked, per_run(1 + award / prev["sol_staked"]), 1)
+
+        # Update each holder's behavior.
+        stake_propensity = compute_stake_propensity(
+            per_run(prev["staker_yield"]), location, scale
+        )
+        keep_prob = compute_step_keep_frac(
+            np.where(
+                staked,
+                staked_policy("staked", stake_propensity),
+                unstaked_policy("unstaked", stake_propensity),
+            ),
+            steps_per_year,
+        )
+        staked ^= rng.random(shape) >= keep_prob
+        return np.einsum("ij,ij->i", balance, staked)
+
+    return iter_cohort_simulation(
+        params, initial_state, steps_per_run, num_runs, rebalance
+    )
+
+
+STEADY_STATE_VARIABLES = ("perc_staked", "staker_yield", "staked_dilution")
+
+
+def is_steady_state(
+    prev, state, base_rate, grow_rate, ltr, timestep, steps_per_year, tolerance
+):
+    """
+    Whether every run has settled by `timestep`.
+
+    Inflation has to have reached its long-term floor for good, and each of
+    `STEADY_STATE_VARIABLES`, all fractions, to be moving by at most
+    `tolerance` a year, judging by its change since the last timestep. The
+    rate is annualized so the same tolerance means the same at any
+    `steps_per_year`. `extrapolate_steady_state` holds them, so a run that
+    stops with `n` years left can be off in them by up to `n * tolerance`.
+    """
+    year = timestep / steps_per_year
+    at_floor = np.all(base_rate * (1 + grow_rate) ** year <= ltr) and np.all(
+        grow_rate <= 0
+    )
+    return at_floor and all(
+        np.all(np.abs(state[var] - prev[var]) * steps_per_year <= tolerance)
+        for var in STEADY_STATE_VARIABLES
+    )
+
+
+def extrapolate_steady_state(state, num_timesteps):
+    """
+    Continue a steady `state` for `num_timesteps` more timesteps.
+
+    Inflation, the share staked, the yield and both dilutions are held, while
+    supply, staked SOL and both valuations keep compounding at their final
+    rates. Returns a dict mapping each state variable to an array of shape
+    `(num_runs, num_timesteps)`.
+    """
+    num_runs = len(state["perc_staked"])
+    shape = (num_runs, num_timesteps)
+    steps = np.arange(1, num_timesteps + 1)
+
+    total_supply = (
+        per_run(state["total_supply"]) * (1 + per_run(state["inflation"])) ** steps
+    )
+    return {
+        "inflation": np.broadcast_to(per_run(state["inflation"]), shape),
+        "perc_staked": np.broadcast_to(per_run(state["perc_staked"]), shape),
+        "sol_staked": per_run(state["perc_staked"]) * total_supply,
+        "total_supply": total_supply,
+        "staker_yield": np.broadcast_to(per_run(state["staker_yield"]), shape),
+        "unstaked_dilution": np.broadcast_to(
+            per_run(state["unstaked_dilution"]), shape
+        ),
+        "staked_dilution": np.broadcast_to(per_run(state["staked_dilution"]), shape),
+        "unstaked_valuation": per_run(state["unstaked_valuation"])
+        * (1 + per_run(state["unstaked_dilution"])) ** steps,
+        "staked_valuation": per_run(state["staked_valuation"])
+        * (1 + per_run(state["staked_dilution"])) ** steps,
+    }
+
+
+def run_vectorized_simulation(
+    params, initial_state, steps_per_run, num_runs, dtype=np.float64
+):
+    """
+    Collect `iter_vectorized_simulation` into a dict mapping each state
+    variable to an array of shape `(num_runs, steps_per_run + 1)` and type
+    `dtype`, where column 0 is the initial state. Each step is computed in
+    float64 whatever `dtype` is, so storing float32 doesn't compound rounding
+    across steps.
+
+    Also returns the first timestep filled in by `extrapolate_steady_state`,
+    or None if every timestep was simulated.
+    """
+    states = iter_vectorized_simulation(params, initial_state, steps_per_run, num_runs)
+    return collect_states(states, initial_state, steps_per_run, num_runs, dtype)
+
+
+def collect_states(states, initial_state, steps_per_run, num_runs, dtype=np.float64):
+    """
+    Collect `states`, as yielded by `iter_vectorized_simulation` or
+    `iter_agent_simulation`, as `run_vectorized_simulation` does.
+    """
+    history = {
+        var: np.empty((num_runs, steps_per_run + 1), dtype) for var in initial_state
+    }
+    for timestep, state in enumerate(states):
+        for var, vals in state.items():
+            history[var][:, timestep] = vals
+    steady_from = timestep + 1
+    if steady_from > steps_per_run:
+        return history, None
+    tail = extrapolate_steady_state(state, steps_per_run + 1 - steady_from)
+    for var, vals in tail.items():
+        history[var][:, steady_from:] = vals
+    return history, steady_from
+
+
+def run_analytic_simulation(
+    params, initial_state, steps_per_run, num_runs, dtype=np.float64
+):
+    """
+    Solve the staker model in closed form, for when both policies are
+    `constant_behavior_policy`.
+
+    Nobody changes behavior, so staked SOL is the initial stake plus every
+    award to date, and supply and valuations compound by cumulative products
+    of their per-step growth factors. Returns the same dict of
+    `(num_runs, steps_per_run + 1)` arrays of type `dtype` as
+    `run_vectorized_simulation`.
+    """
+    shape = (num_runs, steps_per_run + 1)
+
+    steps_per_year = params["steps_per_year"]
+    timestep = np.arange(steps_per_run + 1)
+    annual_inflation = np.broadcast_to(
+        compute_inflation_rate(
+            per_run(params["base_infl_rate"]),
+            per_run(params["dis_infl_rate"]),
+            per_run(params["long_term_infl_rate"]),
+            timestep / per_run(steps_per_year),
+        ),
+        shape,
+    )
+    inflation = np.array(compute_step_rate(annual_inflation, per_run(steps_per_year)))
+    inflation[:, 0] = initial_state["inflation"]
+
+    history = {var: np.empty(shape) for var in initial_state}
+    for var, val in initial_state.items():
+        history[var][:, 0] = val
+
+    # Timestep t compounds the inflation set at timestep t - 1.
+    inflation_prev = inflation[:, :-1]
+    total_supply = history["total_supply"]
+    total_supply[:, 1:] = inflation_prev + 1
+    np.cumprod(total_supply, axis=1, out=total_supply)
+    award = total_supply[:, :-1] * inflation_prev
+    sol_staked = history["sol_staked"]
+    sol_staked[:, 1:] = award
+    np.cumsum(sol_staked, axis=1, out=sol_staked)
+    perc_staked = history["perc_staked"]
+    perc_staked[:, 1:] = sol_staked[:, 1:] / total_supply[:, 1:]
+
+    history["inflation"] = inflation
+    history["staker_yield"][:, 1:] = compute_staker_yield(
+        annual_inflation[:, 1:],
+        per_run(params["vdtr_uptime_freq"]),
+        per_run(params["vdtr_comm_perc"]),
+        perc_staked[:, 1:],
+    )
+    history["unstaked_dilution"][:, 1:] = compute_unstaked_dilution(inflation[:, 1:])
+    history["staked_dilution"][:, 1:] = compute_staked_dilution(
+        inflation[:, 1:], perc_staked[:, 1:]
+    )
+
+    unstaked_valuation = history["unstaked_valuation"]
+    unstaked_valuation[:, 1:] = 1 + compute_unstaked_dilution(inflation_prev)
+    np.cumprod(unstaked_valuation, axis=1, out=unstaked_valuation)
+    staked_valuation = history["staked_valuation"]
+    staked_valuation[:, 1:] = 1 + compute_staked_dilution(
+        inflation_prev, perc_staked[:, :-1]
+    )
+    np.cumprod(staked_valuation, axis=1, out=staked_valuation)
+
+    return {var: vals.astype(dtype, copy=False) for var, vals in history.items()}
+
+
+# Timesteps per year at each granularity. Solana epochs are about two days.
+TIMESTEPS = {"year": 1, "month": 12, "epoch": 182}
+
+# State variables that are rates over a single timestep rather than levels.
+PER_STEP_RATES = ("inflation", "unstaked_dilution", "staked_dilution")
+
+BEHAVIOR2POLICY = {
+    "Constant": constant_behavior_policy,
+    "Proactive": proactive_behavior_policy,
+}
+
+PARTIAL_STATE_UPDATE_BLOCKS = [
+    {
+        "policies": {"staker_behavior": p_staker_behavior},
+        "variables": {
+            "sol_staked": s_sol_staked,
+            "perc_staked": s_perc_staked,
+            "total_supply": s_total_supply,
+            "inflation": s_inflation,
+            "staker_yield": s_staker_yield,
+            "unstaked_dilution": s_unstaked_dilution,
+            "staked_dilution": s_staked_dilution,
+            "unstaked_valuation": s_unstaked_valuation,
+            "staked_valuation": s_staked_valuation,
+        },
+    }
+]
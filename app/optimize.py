@@ -0,0 +1,310 @@
+"""
+Multi-objective search over the economic sliders.
+
+Each objective and constraint is a metric: a state variable reduced over
+the horizon of every run, such as `staker_yield:min` or
+`unstaked_valuation:final`. Objectives are scalarized with a spread of
+weights, and each weighting is searched with differential evolution,
+whose populations run as one vectorized `NumpySimulation` per generation.
+Every feasible point evaluated along the way is kept, and the
+non-dominated ones are returned as the Pareto set.
+
+Usage:
+
+    python optimize.py --param base_infl_rate=0.05:0.15 \\
+        --param dis_infl_rate=-0.3:0 --param long_term_infl_rate=0:0.05 \\
+        --maximize unstaked_valuation:final --maximize perc_staked:final \\
+        --constraint "staker_yield:min>=0.05" --output pareto.csv
+
+Per-step rates (inflation and dilution) are reduced as they are stored, so
+`sum` and `mean` of them depend on `steps_per_year`.
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import functools
+import itertools
+import os
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import differential_evolution
+
+from sweep import latin_hypercube, parse_param, simulate_points
+from utils import build_initial_state, default_params
+
+
+REDUCTIONS = {
+    "final": lambda values: values[:, -1],
+    "mean": lambda values: values.mean(axis=1),
+    "min": lambda values: values.min(axis=1),
+    "max": lambda values: values.max(axis=1),
+    "sum": lambda values: values.sum(axis=1),
+}
+CONSTRAINT_OPS = (">=", "<=")
+
+
+def evaluate_metrics(
+    x, names, metrics, base_params=None, steps_per_run=None, num_runs=1
+):
+    """
+    Simulate each row of `x`, values of the params in `names`, in a single
+    vectorized run, returning each of `metrics`, `(variable, reduction)`
+    pairs, as a `(len(x), len(metrics))` array.
+
+    With `num_runs` above 1, each point's metrics are averaged over its
+    runs, which only differ under the Proactive policy.
+    """
+    points = pd.DataFrame(x, columns=names)
+    result = simulate_points(points, base_params, steps_per_run, num_runs)
+    return np.column_stack(
+        [
+            REDUCTIONS[reduction](result[var]).reshape(len(x), num_runs).mean(axis=1)
+            for var, reduction in metrics
+        ]
+    )
+
+
+def simplex_weights(num_objectives, num_divisions):
+    """
+    Return every weighting of `num_objectives` objectives whose weights are
+    multiples of `1 / num_divisions` summing to 1.
+    """
+    weights = [
+        combo
+        for combo in itertools.product(range(num_divisions + 1), repeat=num_objectives)
+        if sum(combo) == num_divisions
+    ]
+    return np.array(weights, dtype=float) / num_divisions
+
+
+def pareto_mask(costs):
+    """
+    Return which rows of `costs`, an `(n, num_objectives)` array to minimize,
+    no other row dominates. Of rows with identical costs, only one is kept.
+    """
+    candidates = np.arange(len(costs))
+    remaining = costs
+    i = 0
+    while i < len(remaining):
+        # Drop every row that `remaining[i]` dominates, keeping itself.
+        keep = np.any(remaining < remaining[i], axis=1)
+        keep[i] = True
+        candidates, remaining = candidates[keep], remaining[keep]
+        i = np.sum(keep[:i]) + 1
+    mask = np.zeros(len(costs), dtype=bool)
+    mask[candidates] = True
+    return mask
+
+
+def search(
+    weights,
+    bounds,
+    metrics,
+    senses,
+    constraints,
+    scales,
+    base_params=None,
+    steps_per_run=None,
+    num_runs=1,
+    popsize=15,
+    maxiter=100,
+    seed=None,
+):
+    """
+    Minimize one weighting of the scalarized objectives with differential
+    evolution, returning every point evaluated and its metrics.
+
+    The first `len(senses)` of `metrics` are the objectives, and `senses`
+    holds +1 for each to minimize and -1 for each to maximize. The rest are
+    constrained by `constraints`, `(op, bound)` pairs. `scales` holds each
+    metric's `(low, high)` range, to put them on a common footing. Any
+    feasible point scores below every infeasible one.
+    """
+    names = list(bounds)
+    num_objectives = len(senses)
+    low, high = np.array(scales, dtype=float).T
+    span = np.where(high > low, high - low, 1.0)
+    evaluated, values = [], []
+
+    def cost(x):
+        # `x` holds one candidate per column.
+        y = evaluate_metrics(x.T, names, metrics, base_params, steps_per_run, num_runs)
+        evaluated.append(x.T)
+        values.append(y)
+        normed = (y - low) / span
+        objective = normed[:, :num_objectives] * senses
+        scalar = objective @ weights
+        violation = np.zeros(len(y))
+        for i, (op, bound) in enumerate(constraints, num_objectives):
+            gap = (bound - y[:, i]) if op == ">=" else (y[:, i] - bound)
+            violation += np.maximum(gap, 0) / span[i]
+        return np.where(violation > 0, num_objectives + 1 + violation, scalar)
+
+    differential_evolution(
+        cost,
+        list(bounds.values()),
+        popsize=popsize,
+        maxiter=maxiter,
+        seed=seed,
+        polish=False,
+        updating="deferred",
+        vectorized=True,
+    )
+    return np.concatenate(evaluated), np.concatenate(values)
+
+
+def optimize(
+    bounds,
+    minimize=(),
+    maximize=(),
+    constraints=None,
+    base_params=None,
+    steps_per_run=None,
+    num_runs=1,
+    num_divisions=4,
+    num_samples=256,
+    popsize=15,
+    maxiter=100,
+    processes=None,
+    seed=None,
+):
+    """
+    Search `bounds`, a dict mapping each param to a `(low, high)` pair, for
+    the Pareto set of the `minimize` and `maximize` metrics.
+
+    Metrics are `(variable, reduction)` pairs, reduced by `REDUCTIONS`, and
+    `constraints` maps each constrained metric to an `(op, bound)` pair,
+    with `op` one of `CONSTRAINT_OPS`. Objectives are weighted by
+    `simplex_weights(num_objectives, num_divisions)`, each weighting searched
+    in its own process, after `num_samples` Latin-hypercube points set the
+    range of each metric.
+
+    Returns one row per Pareto-optimal point, with its params and a
+    `<variable>:<reduction>` column per metric, sorted by the first
+    objective.
+    """
+    constraints = constraints or {}
+    objectives = list(minimize) + list(maximize)
+    if not objectives:
+        raise ValueError("Need at least one objective")
+    metrics = objectives + list(constraints)
+    senses = np.array([1.0] * len(minimize) + [-1.0] * len(maximize))
+    names = list(bounds)
+
+    start = latin_hypercube(bounds, num_samples, seed=seed).to_numpy()
+    start_values = evaluate_metrics(
+        start, names, metrics, base_params, steps_per_run, num_runs
+    )
+    scales = list(zip(start_values.min(axis=0), start_values.max(axis=0)))
+
+    weightings = simplex_weights(len(objectives), num_divisions)
+    with ProcessPoolExecutor(processes) as executor:
+        search_weights = functools.partial(
+            search,
+            bounds=bounds,
+            metrics=metrics,
+            senses=senses,
+            constraints=list(constraints.values()),
+            scales=scales,
+            base_params=base_params,
+            steps_per_run=steps_per_run,
+            num_runs=num_runs,
+            popsize=popsize,
+            maxiter=maxiter,
+            seed=seed,
+        )
+        searches = list(executor.map(search_weights, weightings))
+
+    x = np.concatenate([start] + [evaluated for evaluated, _ in searches])
+    y = np.concatenate([start_values] + [values for _, values in searches])
+    feasible = np.ones(len(y), dtype=bool)
+    for i, (op, bound) in enumerate(constraints.values(), len(objectives)):
+        feasible &= (y[:, i] >= bound) if op == ">=" else (y[:, i] <= bound)
+    x, y = x[feasible], y[feasible]
+    pareto = pareto_mask(y[:, : len(objectives)] * senses)
+
+    front = pd.DataFrame(x[pareto], columns=names)
+    for i, (var, reduction) in enumerate(metrics):
+        front[f"{var}:{reduction}"] = y[pareto, i]
+    first = f"{objectives[0][0]}:{objectives[0][1]}"
+    return front.sort_values(first, ascending=senses[0] > 0, ignore_index=True)
+
+
+def parse_metric(spec):
+    """
+    Parse `variable[:reduction]` into a metric, reducing by `final` if no
+    reduction is given.
+    """
+    var, _, reduction = spec.partition(":")
+    if var not in build_initial_state(default_params()):
+        raise argparse.ArgumentTypeError(f"Unknown state variable {var}")
+    reduction = reduction or "final"
+    if reduction not in REDUCTIONS:
+        raise argparse.ArgumentTypeError(f"Unknown reduction {reduction}")
+    return var, reduction
+
+
+def parse_constraint(spec):
+    """
+    Parse `variable[:reduction]>=bound` or `variable[:reduction]<=bound`
+    into a metric and its `(op, bound)` pair.
+    """
+    for op in CONSTRAINT_OPS:
+        metric, sep, bound = spec.partition(op)
+        if sep:
+            return parse_metric(metric), (op, float(bound))
+    raise argparse.ArgumentTypeError("Expected metric>=bound or metric<=bound")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--param", type=parse_param, action="append", required=True)
+    parser.add_argument("--minimize", type=parse_metric, action="append", default=[])
+    parser.add_argument("--maximize", type=parse_metric, action="append", default=[])
+    parser.add_argument(
+        "--constraint", type=parse_constraint, action="append", default=[]
+    )
+    parser.add_argument(
+        "--steps", type=int, help="Defaults to total_years worth of timesteps"
+    )
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument(
+        "--divisions",
+        type=int,
+        default=4,
+        help="Each objective's weight is a multiple of 1/divisions",
+    )
+    parser.add_argument("--samples", type=int, default=256)
+    parser.add_argument("--popsize", type=int, default=15)
+    parser.add_argument("--maxiter", type=int, default=100)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--output", default="pareto.csv")
+    args = parser.parse_args(argv)
+    if not args.minimize and not args.maximize:
+        parser.error("Pass at least one --minimize or --maximize")
+
+    front = optimize(
+        {name: values[:2] for name, values in args.param},
+        minimize=args.minimize,
+        maximize=args.maximize,
+        constraints=dict(args.constraint),
+        steps_per_run=args.steps,
+        num_runs=args.runs,
+        num_divisions=args.divisions,
+        num_samples=args.samples,
+        popsize=args.popsize,
+        maxiter=args.maxiter,
+        processes=args.processes,
+        seed=args.seed,
+    )
+    if front.empty:
+        print("No point evaluated met every constraint")
+    else:
+        print(front.to_string())
+    front.to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+Opt-in instrumentation of the simulation pipeline.
+
+Functions decorated with `instrument`, and blocks wrapped in `stage`, report
+to the `Profiler` active on their thread, if any. With no profiler active
+they run as is, so instrumentation costs a single check per call.
+
+    with Profiler(capture="cprofile") as profiler:
+        df = simulate(params)
+    profiler.to_json("profile.json")
+"""
+
+from contextlib import contextmanager
+import cProfile
+import functools
+import io
+import json
+import pstats
+import threading
+import time
+import tracemalloc
+
+
+# The profiler active on each thread, so concurrent sessions of the app
+# each profile only their own script run.
+_ACTIVE = threading.local()
+# How many profilers rely on the tracing they started, since `tracemalloc`
+# traces the whole process.
+_TRACING_LOCK = threading.Lock()
+_TRACING_USERS = 0
+
+
+def active_profiler():
+    """
+    Return the profiler active on the current thread, or None.
+    """
+    return getattr(_ACTIVE, "profiler", None)
+
+
+@contextmanager
+def activated(profiler):
+    """
+    Make `profiler`, which may be None, the active one on the current thread
+    for the enclosed block, so work handed to another thread reports to the
+    profiler of the thread that handed it over.
+    """
+    previous = active_profiler()
+    _ACTIVE.profiler = profiler
+    try:
+        yield
+    finally:
+        _ACTIVE.profiler = previous
+
+
+class Profiler:
+    """
+    Record wall time, call counts and peak memory per stage, for stages run
+    on the thread that started it.
+
+    Peak memory is the most allocated, beyond what was allocated when the
+    stage started, at any point while it ran. It is traced with `tracemalloc`,
+    which slows everything down, so pass `trace_memory=False` for timings
+    alone. `capture` also records a full profile with `"cprofile"` or, if it
+    is installed, `"pyinstrument"`.
+    """
+
+    CAPTURES = ("cprofile", "pyinstrument")
+
+    def __init__(self, trace_memory=True, capture=None):
+        if capture is not None and capture not in self.CAPTURES:
+            raise ValueError(f"Unknown capture mode: {capture}")
+        self.trace_memory = trace_memory
+        self.capture = capture
+        self.stages = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._capturer = None
+        self._started_tracing = False
+
+    def start(self):
+        global _TRACING_USERS
+        if self.trace_memory:
+            with _TRACING_LOCK:
+                # Share tracing another profiler started, but leave alone any
+                # started outside this module.
+                if _TRACING_USERS or not tracemalloc.is_tracing():
+                    if not _TRACING_USERS:
+                        tracemalloc.start()
+                    _TRACING_USERS += 1
+                    self._started_tracing = True
+        if self.capture == "cprofile":
+            self._capturer = cProfile.Profile()
+            self._capturer.enable()
+        elif self.capture == "pyinstrument":
+            from pyinstrument import Profiler as PyinstrumentProfiler
+
+            self._capturer = PyinstrumentProfiler()
+            self._capturer.start()
+        _ACTIVE.profiler = self
+        return self
+
+    def stop(self):
+        global _TRACING_USERS
+        if active_profiler() is self:
+            _ACTIVE.profiler = None
+        if self.capture == "cprofile":
+            self._capturer.disable()
+        elif self.capture == "pyinstrument":
+            self._capturer.stop()
+        if self._started_tracing:
+            with _TRACING_LOCK:
+                _TRACING_USERS -= 1
+                if not _TRACING_USERS:
+                    tracemalloc.stop()
+            self._started_tracing = False
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @property
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextmanager
+    def stage(self, name):
+        stack = self._stack
+        frame = {"peak": 0, "start_bytes": 0}
+        if self.trace_memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                # Resetting the peak would lose the enclosing stage's, so
+                # carry it over first.
+                stack[-1]["peak"] = max(stack[-1]["peak"], peak)
+            tracemalloc.reset_peak()
+            frame["start_bytes"] = current
+        stack.append(frame)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            stack.pop()
+            peak_bytes = None
+            if self.trace_memory and tracemalloc.is_tracing():
+                peak = max(frame["peak"], tracemalloc.get_traced_memory()[1])
+                peak_bytes = peak - frame["start_bytes"]
+                if stack:
+                    stack[-1]["peak"] = max(stack[-1]["peak"], peak)
+            self._record(name, seconds, peak_bytes)
+
+    def _record(self, name, seconds, peak_bytes):
+        with self._lock:
+            stats = self.stages.setdefault(
+                name, {"calls": 0, "seconds": 0.0, "peak_bytes": None}
+            )
+            stats["calls"] += 1
+            stats["seconds"] += seconds
+            if peak_bytes is not None:
+                stats["peak_bytes"] = max(stats["peak_bytes"] or 0, peak_bytes)
+
+    def report(self):
+        """
+        Return the per-stage stats, slowest first.
+        """
+        with self._lock:
+            return dict(
+                sorted(self.stages.items(), key=lambda item: -item[1]["seconds"])
+            )
+
+    def captured(self):
+        """
+        Return the full profile recorded by `capture` as text.
+        """
+        if self.capture == "cprofile":
+            out = io.StringIO()
+            pstats.Stats(self._capturer, stream=out).sort_stats(
+                "cumulative"
+            ).print_stats(50)
+            return out.getvalue()
+        if self.capture == "pyinstrument":
+            return self._capturer.output_text()
+        return None
+
+    def to_json(self, path=None):
+        """
+        Serialize the report, writing it to `path` if given.
+        """
+        report = json.dumps({"stages": self.report()}, indent=2)
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(report)
+        return report
+
+
+@contextmanager
+def stage(name):
+    """
+    Record the enclosed block as `name` on the active profiler, if any.
+    """
+    profiler = active_profiler()
+    if profiler is None:
+        yield
+    else:
+        with profiler.stage(name):
+            yield
+
+
+def instrument(name):
+    """
+    Record each call of the decorated function as stage `name`.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profiler = active_profiler()
+            if profiler is None:
+                return func(*args, **kwargs)
+            with profiler.stage(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
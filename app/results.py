@@ -0,0 +1,104 @@
+import numpy as np
+
+
+class SimulationResult:
+    """
+    Columnar simulation output.
+
+    Holds one `(num_runs, num_timesteps)` array per state variable, so row
+    `r`, column `t` is run `r + 1` at timestep `first_timestep + t`. The flat
+    `run` and `timestep` columns are derived from that shape rather than
+    stored, and `to_pandas` and `to_arrow` wrap the state arrays without
+    copying them.
+
+    `steady_from` is the first timestep extrapolated from a steady state
+    rather than simulated, if any. See `model.extrapolate_steady_state`.
+    """
+
+    def __init__(self, arrays, first_timestep=0, steady_from=None):
+        self.arrays = arrays
+        self.first_timestep = first_timestep
+        self.steady_from = steady_from
+        self.num_runs, self.num_timesteps = next(iter(arrays.values())).shape
+
+    @classmethod
+    def from_flat_results(cls, flat_results, variables, dtype=np.float64):
+        """
+        Pack cadCAD's `flat_results`, one dict per run and timestep ordered by
+        run then timestep, into arrays.
+        """
+        num_runs = flat_results[-1]["run"]
+        return cls(
+            {
+                var: np.fromiter(
+                    (row[var] for row in flat_results), dtype, len(flat_results)
+                ).reshape(num_runs, -1)
+                for var in variables
+            }
+        )
+
+    def __getitem__(self, var):
+        return self.arrays[var]
+
+    def timesteps(self, start, stop):
+        """
+        Return timesteps `start` through `stop - 1` as a result of views.
+        """
+        offset = self.first_timestep
+        return SimulationResult(
+            {
+                var: vals[:, start - offset : stop - offset]
+                for var, vals in self.arrays.items()
+            },
+            start,
+            self.steady_from,
+        )
+
+    def freeze(self):
+        """
+        Make every state array read-only, so the result can be shared, and
+        return it.
+        """
+        for vals in self.arrays.values():
+            vals.setflags(write=False)
+        return self
+
+    @property
+    def nbytes(self):
+        return sum(vals.nbytes for vals in self.arrays.values())
+
+    def _index_columns(self):
+        return {
+            "run": np.repeat(
+                np.arange(1, self.num_runs + 1, dtype=np.int32), self.num_timesteps
+            ),
+            "timestep": np.tile(
+                np.arange(
+                    self.first_timestep,
+                    self.first_timestep + self.num_timesteps,
+                    dtype=np.int32,
+                ),
+                self.num_runs,
+            ),
+        }
+
+    def _columns(self):
+        columns = {var: vals.reshape(-1) for var, vals in self.arrays.items()}
+        columns.update(self._index_columns())
+        return columns
+
+    def to_pandas(self):
+        """
+        Return one row per run and timestep, with a column per state variable
+        plus `run` and `timestep`. `steady_from` is kept in `DataFrame.attrs`.
+        """
+        import pandas as pd
+
+        df = pd.DataFrame(self._columns(), copy=False)
+        df.attrs["steady_from"] = self.steady_from
+        return df
+
+    def to_arrow(self):
+        import pyarrow as pa
+
+        return pa.table(self._columns())
@@ -0,0 +1,124 @@
+"""
+Run a single simulation headless and write its results to a file.
+
+Inputs default to `const.yaml`, as in the app. Neither streamlit nor altair
+is imported, so this starts quickly in batch jobs and containers.
+
+Usage:
+
+    python run.py --staked-policy Proactive --param base_infl_rate=0.06 \\
+        --runs 100 --output simulation.parquet
+
+The output format follows the extension of `--output`: `.csv`, `.parquet`,
+or `.arrow`/`.feather` for Arrow IPC.
+"""
+
+import argparse
+from contextlib import nullcontext
+import os
+
+from model import BEHAVIOR2POLICY, TIMESTEPS
+from profiling import Profiler
+from utils import (
+    default_params,
+    load_constants,
+    resample_yearly,
+    simulate,
+    summarize_ensemble,
+)
+
+
+WRITERS = {
+    ".csv": lambda df, path: df.to_csv(path, index=False),
+    ".parquet": lambda df, path: df.to_parquet(path, index=False),
+    ".arrow": lambda df, path: df.to_feather(path),
+    ".feather": lambda df, path: df.to_feather(path),
+}
+# Params that count something, so only take whole numbers.
+INT_PARAMS = ("steps_per_year", "num_agents", "steady_state_window")
+
+
+def parse_param(spec):
+    """
+    Parse `name=value` into a name and its numeric value, an int for
+    `INT_PARAMS` and a float otherwise.
+    """
+    name, _, value = spec.partition("=")
+    if name not in default_params() or name.endswith("_policy") or name == "seed":
+        raise argparse.ArgumentTypeError(f"Unknown param {name}")
+    kind = int if name in INT_PARAMS else float
+    try:
+        return name, kind(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"Expected {'an integer' if kind is int else 'a number'} for {name}, "
+            f"got {value}"
+        )
+
+
+def write(df, path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in WRITERS:
+        raise ValueError(f"Unsupported output format: {ext}")
+    WRITERS[ext](df, path)
+
+
+def main(argv=None):
+    C = load_constants()
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--unstaked-policy", choices=list(BEHAVIOR2POLICY))
+    parser.add_argument("--staked-policy", choices=list(BEHAVIOR2POLICY))
+    parser.add_argument("--param", type=parse_param, action="append", default=[])
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--timestep", choices=list(TIMESTEPS))
+    parser.add_argument(
+        "--steps", type=int, help="Defaults to total_years worth of timesteps"
+    )
+    parser.add_argument("--runs", type=int, default=C["num_runs"])
+    parser.add_argument("--backend", choices=["cadcad", "numpy", "agents"])
+    parser.add_argument("--dtype", choices=["float32", "float64"], default="float64")
+    parser.add_argument(
+        "--yearly",
+        action="store_true",
+        help="Keep one row per year, with per-timestep rates annualized",
+    )
+    parser.add_argument(
+        "--summarize",
+        action="store_true",
+        help="Write per-timestep means and percentile bands across runs",
+    )
+    parser.add_argument("--output", default="simulation.parquet")
+    parser.add_argument("--profile", help="Write per-stage timings as JSON")
+    parser.add_argument(
+        "--capture",
+        choices=Profiler.CAPTURES,
+        help="Also print a full profile when profiling",
+    )
+    args = parser.parse_args(argv)
+
+    params = dict(args.param)
+    if args.unstaked_policy is not None:
+        params["unstaked_policy"] = args.unstaked_policy
+    if args.staked_policy is not None:
+        params["staked_policy"] = args.staked_policy
+    if args.seed is not None:
+        params["seed"] = args.seed
+    if args.timestep is not None:
+        params["steps_per_year"] = TIMESTEPS[args.timestep]
+    profiler = Profiler(capture=args.capture) if args.profile else None
+    with profiler or nullcontext():
+        df = simulate(params, args.steps, args.runs, args.backend, args.dtype)
+        if args.yearly:
+            steps_per_year = params.get("steps_per_year", TIMESTEPS[C["timestep"]])
+            df = resample_yearly(df, steps_per_year)
+        if args.summarize:
+            df = summarize_ensemble(df)
+        write(df, args.output)
+    if profiler is not None:
+        profiler.to_json(args.profile)
+        if args.capture is not None:
+            print(profiler.captured())
+
+
+if __name__ == "__main__":
+    main()
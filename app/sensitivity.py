@@ -0,0 +1,227 @@
+"""
+Global (Sobol) sensitivity analysis of final outcomes to the economic sliders.
+
+Draws a Saltelli design over the given bounds, simulates every point in
+vectorized batches across a process pool, and estimates first- and
+total-order Sobol indices for each output, with bootstrap confidence
+intervals.
+
+Usage:
+
+    python sensitivity.py --param vdtr_comm_perc=0:0.2 \\
+        --param dis_infl_rate=-0.3:0 --param yield_location=0:0.1 \\
+        --staked-policy Proactive --unstaked-policy Proactive \\
+        --samples 4096 --output sensitivity.csv
+
+Each analysis takes `samples * (num_params + 2)` simulations. Validator
+commission and yield location only reach the outputs through the Proactive
+policy, so under the default Constant policies their indices are 0.
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+import numpy as np
+import pandas as pd
+from scipy.stats import qmc
+
+from model import BEHAVIOR2POLICY
+from sweep import chunk_params, parse_param, simulate_points
+from utils import default_params
+
+
+OUTPUTS = ["staked_valuation", "perc_staked"]
+
+
+def saltelli_points(bounds, num_samples, seed=None):
+    """
+    Build the Saltelli design for `bounds`, a dict mapping each param to a
+    `(low, high)` pair.
+
+    Rows are the `num_samples` points of matrix A, then those of B, then, for
+    each param in turn, those of A with that param's column taken from B.
+    """
+    names = list(bounds)
+    low, high = np.array(list(bounds.values()), dtype=float).T
+    sampler = qmc.Sobol(d=2 * len(names), seed=seed)
+    base = qmc.scale(sampler.random(num_samples), np.tile(low, 2), np.tile(high, 2))
+    a, b = base[:, : len(names)], base[:, len(names) :]
+    blocks = [a, b]
+    for i in range(len(names)):
+        ab = a.copy()
+        ab[:, i] = b[:, i]
+        blocks.append(ab)
+    return pd.DataFrame(np.concatenate(blocks), columns=names)
+
+
+def final_outputs(points, outputs=OUTPUTS, base_params=None, steps_per_run=None):
+    """
+    Simulate every row of `points` in a single vectorized run, returning the
+    final value of each of `outputs` as a `(len(points), len(outputs))` array.
+    """
+    result = simulate_points(points, base_params, steps_per_run)
+    return np.column_stack([result[var][:, -1] for var in outputs])
+
+
+def evaluate(
+    points,
+    outputs=OUTPUTS,
+    base_params=None,
+    steps_per_run=None,
+    processes=None,
+    chunk_size=10_000,
+):
+    """
+    Run `final_outputs` over chunks of `points` across a process pool, each
+    chunk seeded by `chunk_params`.
+    """
+    starts = range(0, len(points), chunk_size)
+    with ProcessPoolExecutor(processes) as executor:
+        futures = [
+            executor.submit(
+                final_outputs,
+                points.iloc[start : start + chunk_size],
+                outputs=outputs,
+                base_params=chunk_params(base_params, start),
+                steps_per_run=steps_per_run,
+            )
+            for start in starts
+        ]
+        return np.concatenate([future.result() for future in futures])
+
+
+def sobol_indices(y_a, y_b, y_ab):
+    """
+    Estimate first-order (Saltelli 2010) and total-order (Jansen 1999) Sobol
+    indices from model outputs on A, on B, and on each AB matrix, given as
+    arrays of shape `(..., 1, N)`, `(..., 1, N)` and `(..., num_params, N)`.
+    """
+    var = np.var(np.concatenate([y_a, y_b], axis=-1), axis=-1)
+    first = np.mean(y_b * (y_ab - y_a), axis=-1) / var
+    total = 0.5 * np.mean((y_a - y_ab) ** 2, axis=-1) / var
+    return first, total
+
+
+def analyze(names, y, num_samples, num_resamples=1000, confidence=0.95, seed=None):
+    """
+    Estimate Sobol indices, with bootstrap confidence intervals, for one
+    output `y` evaluated on the rows of `saltelli_points`.
+
+    An output that never varies has no variance to apportion, so every
+    index is 0 rather than undefined.
+    """
+    if np.ptp(y) == 0:
+        return pd.DataFrame(
+            0.0,
+            index=pd.Index(names, name="param"),
+            columns=["S1", "S1_low", "S1_high", "ST", "ST_low", "ST_high"],
+        )
+    # The indices are unchanged by rescaling `y`, but the first-order
+    # estimator's variance grows with its mean, so standardize it first.
+    y = (y - y.mean()) / y.std()
+    y_a = y[None, :num_samples]
+    y_b = y[None, num_samples : 2 * num_samples]
+    y_ab = y[2 * num_samples :].reshape(len(names), num_samples)
+    first, total = sobol_indices(y_a, y_b, y_ab)
+
+    rng = np.random.default_rng(seed)
+    boot = rng.integers(num_samples, size=(num_resamples, 1, num_samples))
+    first_boot, total_boot = sobol_indices(
+        y_a[0, boot], y_b[0, boot], y_ab[:, boot[:, 0]].swapaxes(0, 1)
+    )
+    tails = 100 * np.array([(1 - confidence) / 2, (1 + confidence) / 2])
+    first_low, first_high = np.percentile(first_boot, tails, axis=0)
+    total_low, total_high = np.percentile(total_boot, tails, axis=0)
+    return pd.DataFrame(
+        {
+            "S1": first,
+            "S1_low": first_low,
+            "S1_high": first_high,
+            "ST": total,
+            "ST_low": total_low,
+            "ST_high": total_high,
+        },
+        index=pd.Index(names, name="param"),
+    )
+
+
+def sensitivity(
+    bounds,
+    num_samples,
+    outputs=OUTPUTS,
+    base_params=None,
+    steps_per_run=None,
+    processes=None,
+    num_resamples=1000,
+    confidence=0.95,
+    seed=None,
+):
+    """
+    Run a full Sobol analysis over `bounds` for each of `outputs`.
+
+    Returns one row per output and param, with first-order (`S1`) and
+    total-order (`ST`) indices and their confidence bounds.
+    """
+    points = saltelli_points(bounds, num_samples, seed=seed)
+    y = evaluate(points, outputs, base_params, steps_per_run, processes)
+    return pd.concat(
+        {
+            output: analyze(
+                list(bounds), y[:, i], num_samples, num_resamples, confidence, seed
+            )
+            for i, output in enumerate(outputs)
+        },
+        names=["output"],
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--param", type=parse_param, action="append", required=True)
+    parser.add_argument(
+        "--samples", type=int, default=1024, help="Base sample size, a power of 2"
+    )
+    parser.add_argument("--output-var", choices=OUTPUTS, action="append")
+    parser.add_argument(
+        "--staked-policy", choices=list(BEHAVIOR2POLICY), default="Constant"
+    )
+    parser.add_argument(
+        "--unstaked-policy", choices=list(BEHAVIOR2POLICY), default="Constant"
+    )
+    parser.add_argument(
+        "--steps", type=int, help="Defaults to total_years worth of timesteps"
+    )
+    parser.add_argument("--resamples", type=int, default=1000)
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument(
+        "--seed", type=int, help="Seeds the design, the bootstrap and the policies"
+    )
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--output", default="sensitivity.csv")
+    args = parser.parse_args(argv)
+
+    base_params = dict(
+        default_params(),
+        staked_policy=args.staked_policy,
+        unstaked_policy=args.unstaked_policy,
+    )
+    if args.seed is not None:
+        base_params["seed"] = args.seed
+    indices = sensitivity(
+        {name: values[:2] for name, values in args.param},
+        args.samples,
+        outputs=args.output_var or OUTPUTS,
+        base_params=base_params,
+        steps_per_run=args.steps,
+        processes=args.processes,
+        num_resamples=args.resamples,
+        confidence=args.confidence,
+        seed=args.seed,
+    )
+    print(indices.round(3).to_string())
+    indices.to_csv(args.output)
+
+
+if __name__ == "__main__":
+    main()
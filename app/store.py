@@ -0,0 +1,133 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from results import SimulationResult
+
+
+class ResultStore:
+    """
+    Simulation results for many parameter points, on disk and memory-mapped.
+
+    A store is a directory holding:
+
+    - `points.parquet`, the params of each point, indexed by point label
+    - `<variable>.npy`, one `(num_points, num_runs, num_timesteps)` array per
+      state variable
+    - `written.npy`, whether each point's results have been written
+    - `meta.json`, the shape and variables above
+
+    Points are written in any order, by any number of processes, as their
+    runs complete. Reading one point or variable only pages in its slice of
+    the arrays, so stores far larger than memory open instantly.
+    """
+
+    def __init__(self, path, points, arrays, written):
+        self.path = path
+        self.points = points
+        self.arrays = arrays
+        self.written = written
+        self.num_points, self.num_runs, self.num_timesteps = next(
+            iter(arrays.values())
+        ).shape
+
+    @classmethod
+    def create(cls, path, points, variables, num_runs, num_timesteps, dtype):
+        """
+        Lay out an empty store at `path` for each row of `points`, a DataFrame
+        of params.
+        """
+        os.makedirs(path)
+        points.to_parquet(os.path.join(path, "points.parquet"))
+        shape = (len(points), num_runs, num_timesteps)
+        for var in variables:
+            np.lib.format.open_memmap(
+                os.path.join(path, f"{var}.npy"), "w+", np.dtype(dtype), shape
+            )
+        np.lib.format.open_memmap(
+            os.path.join(path, "written.npy"), "w+", bool, (len(points),)
+        )
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump(
+                {
+                    "variables": list(variables),
+                    "num_runs": num_runs,
+                    "num_timesteps": num_timesteps,
+                    "dtype": np.dtype(dtype).name,
+                },
+                f,
+            )
+        return cls.open(path, "r+")
+
+    @classmethod
+    def open(cls, path, mode="r"):
+        """
+        Open the store at `path`, read-only unless `mode` is "r+".
+        """
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        return cls(
+            path,
+            pd.read_parquet(os.path.join(path, "points.parquet")),
+            {
+                var: np.load(os.path.join(path, f"{var}.npy"), mmap_mode=mode)
+                for var in meta["variables"]
+            },
+            np.load(os.path.join(path, "written.npy"), mmap_mode=mode),
+        )
+
+    def __getitem__(self, var):
+        return self.arrays[var]
+
+    def positions(self, labels):
+        """
+        Return the array positions of the points labelled `labels`.
+        """
+        return self.points.index.get_indexer(labels)
+
+    def write(self, labels, result):
+        """
+        Store `result`, holding `num_runs` consecutive runs per point in
+        `labels`, and mark those points written.
+        """
+        positions = self.positions(labels)
+        for var, vals in self.arrays.items():
+            vals[positions] = result[var].reshape(
+                len(positions), self.num_runs, self.num_timesteps
+            )
+        for vals in self.arrays.values():
+            vals.flush()
+        # Only flag points once their values are on disk, so readers never see
+        # a point that is flagged but unwritten.
+        self.written[positions] = True
+        self.written.flush()
+
+    def result(self, label, runs=None, variables=None):
+        """
+        Return the runs of the point labelled `label` as a `SimulationResult`
+        of memory-mapped views, without reading anything else.
+
+        `runs` selects runs by number, from 1, and defaults to all of them.
+        The selected runs are renumbered from 1 in the result.
+        """
+        position = self.points.index.get_loc(label)
+        if not self.written[position]:
+            raise KeyError(f"Point {label} has not been written")
+        runs = slice(None) if runs is None else np.asarray(runs) - 1
+        return SimulationResult(
+            {
+                var: self.arrays[var][position, runs].reshape(-1, self.num_timesteps)
+                for var in variables or self.arrays
+            }
+        )
+
+    def locate(self, **params):
+        """
+        Return the labels of the points whose params equal `params`.
+        """
+        matches = np.ones(self.num_points, dtype=bool)
+        for name, value in params.items():
+            matches &= np.isclose(self.points[name].to_numpy(), value)
+        return self.points.index[matches]
@@ -0,0 +1,239 @@
+"""
+Precomputed response surfaces over the economic sliders.
+
+A surface is a `ResultStore` holding every timestep of a grid sweep, plus
+the grid and the params it was built with. `ResponseSurface.lookup`
+interpolates results for any point inside the grid, in about the time it
+takes to read its neighbours, instead of simulating it.
+
+Usage:
+
+    python surface.py --param base_infl_rate=0:0.2:0.005 \\
+        --param dis_infl_rate=-0.2:0:0.005 \\
+        --param long_term_infl_rate=0:0.2:0.005 --output surface
+
+Then set `response_surface: surface` in `const.yaml`, and the app looks up
+results from it instead of simulating, wherever it can.
+
+Interpolation is approximate. Inflation bends where it reaches its
+long-term floor, so near the floor interpolated inflation and yields can be
+off by several percent even on the grid above. Under the Proactive policy
+each point holds random runs, and interpolating between them can be off by
+more. Policies default to Proactive: with both Constant, the model is solved
+in closed form, exactly and no slower than a lookup, so the app never uses
+such a surface.
+"""
+
+import argparse
+import itertools
+import json
+import os
+
+import numpy as np
+
+from model import BEHAVIOR2POLICY
+from results import SimulationResult
+from store import ResultStore
+from sweep import grid, parse_param, store_sweep
+from utils import default_params
+
+
+# Params that only scale the listed state variables in proportion to
+# themselves, so one surface serves every value of them.
+LINEAR_PARAMS = {
+    "init_supply": ("sol_staked", "total_supply"),
+    "initial_valuation": ("unstaked_valuation", "staked_valuation"),
+}
+# Params only the Proactive policy reads, so a surface built with Constant
+# policies serves every value of them.
+PROACTIVE_PARAMS = ("yield_location", "yield_scale", "seed")
+
+
+class ResponseSurface:
+    """
+    Simulation results over a grid of params, with linear interpolation
+    between grid points.
+
+    `axes` maps each gridded param to its sorted values, in the order of the
+    sweep that built `store`. Every other param is fixed at its value in
+    `base_params`, apart from `LINEAR_PARAMS`, and `PROACTIVE_PARAMS` when
+    neither policy is Proactive.
+    """
+
+    def __init__(self, store, axes, base_params, backend="numpy"):
+        self.store = store
+        self.axes = axes
+        self.base_params = base_params
+        self.backend = backend
+
+    @classmethod
+    def build(
+        cls,
+        path,
+        ranges,
+        base_params=None,
+        steps_per_run=None,
+        num_runs=1,
+        processes=None,
+        chunk_size=1000,
+        dtype=np.float32,
+    ):
+        """
+        Sweep every combination of `ranges`, a dict mapping each param to the
+        values it takes, into a new surface at `path`.
+        """
+        base_params = default_params() if base_params is None else base_params
+        axes = {
+            name: sorted(float(val) for val in vals) for name, vals in ranges.items()
+        }
+        store_sweep(
+            grid(axes),
+            path,
+            base_params,
+            steps_per_run,
+            num_runs,
+            processes,
+            chunk_size,
+            dtype,
+        )
+        with open(os.path.join(path, "surface.json"), "w") as f:
+            json.dump({"axes": axes, "base_params": base_params}, f)
+        return cls.open(path)
+
+    @classmethod
+    def open(cls, path):
+        with open(os.path.join(path, "surface.json")) as f:
+            meta = json.load(f)
+        axes = {name: np.array(vals) for name, vals in meta["axes"].items()}
+        return cls(ResultStore.open(path), axes, meta["base_params"])
+
+    def covers(self, params, steps_per_run, num_runs=1, backend="numpy"):
+        """
+        Return whether `lookup` can answer for these simulation inputs.
+        """
+        if (
+            backend != self.backend
+            or num_runs != self.store.num_runs
+            or steps_per_run + 1 != self.store.num_timesteps
+        ):
+            return False
+        ignored = set(LINEAR_PARAMS)
+        if "Proactive" not in (
+            self.base_params["staked_policy"],
+            self.base_params["unstaked_policy"],
+        ):
+            ignored.update(PROACTIVE_PARAMS)
+        for name, value in params.items():
+            if name in ignored:
+                continue
+            if name in self.axes:
+                vals = self.axes[name]
+                if not vals[0] - 1e-9 <= value <= vals[-1] + 1e-9:
+                    return False
+            elif not _same(value, self.base_params.get(name)):
+                return False
+        return True
+
+    def lookup(self, params, steps_per_run, num_runs=1, backend="numpy"):
+        """
+        Return the `SimulationResult` for these simulation inputs, as
+        `build_simulation` takes them, interpolated from the grid. Returns
+        None if they are off the grid, or differ from the surface's in any
+        other param it depends on.
+
+        Each gridded param is interpolated linearly between the grid values
+        either side of it, so values on the grid are read back as they were
+        simulated.
+        """
+        if not self.covers(params, steps_per_run, num_runs, backend):
+            return None
+        # The neighbouring grid indices along each axis, with their weights.
+        neighbours = []
+        for name, vals in self.axes.items():
+            if len(vals) == 1:
+                neighbours.append([(0, 1.0)])
+                continue
+            i = int(np.clip(np.searchsorted(vals, params[name]) - 1, 0, len(vals) - 2))
+            frac = np.clip((params[name] - vals[i]) / (vals[i + 1] - vals[i]), 0, 1)
+            neighbours.append(
+                [
+                    (j, weight)
+                    for j, weight in ((i, 1 - frac), (i + 1, frac))
+                    if not np.isclose(weight, 0, atol=1e-9)
+                ]
+            )
+        shape = [len(vals) for vals in self.axes.values()]
+        corners = [
+            (
+                np.ravel_multi_index([j for j, _ in corner], shape),
+                np.prod([weight for _, weight in corner]),
+            )
+            for corner in itertools.product(*neighbours)
+        ]
+
+        arrays = {}
+        for var, vals in self.store.arrays.items():
+            arrays[var] = sum(
+                weight * vals[position].astype(np.float64)
+                for position, weight in corners
+            )
+        for name, variables in LINEAR_PARAMS.items():
+            scale = params[name] / self.base_params[name]
+            for var in variables:
+                arrays[var] = arrays[var] * scale
+        return SimulationResult(arrays)
+
+
+def _same(value, base_value):
+    if isinstance(value, (int, float)) and isinstance(base_value, (int, float)):
+        return np.isclose(value, base_value, rtol=1e-9, atol=1e-12)
+    return value == base_value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--param", type=parse_param, action="append", required=True)
+    parser.add_argument(
+        "--staked-policy", choices=list(BEHAVIOR2POLICY), default="Proactive"
+    )
+    parser.add_argument(
+        "--unstaked-policy", choices=list(BEHAVIOR2POLICY), default="Proactive"
+    )
+    parser.add_argument(
+        "--steps", type=int, help="Defaults to total_years worth of timesteps"
+    )
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--dtype", choices=["float32", "float64"], default="float32")
+    parser.add_argument("--output", default="surface")
+    args = parser.parse_args(argv)
+
+    ranges = {}
+    for name, values in args.param:
+        if len(values) != 3:
+            parser.error(f"--param {name} needs a step, as low:high:step")
+        low, high, step = values
+        ranges[name] = np.arange(low, high + step / 2, step).round(10)
+    surface = ResponseSurface.build(
+        args.output,
+        ranges,
+        base_params=dict(
+            default_params(),
+            staked_policy=args.staked_policy,
+            unstaked_policy=args.unstaked_policy,
+        ),
+        steps_per_run=args.steps,
+        num_runs=args.runs,
+        processes=args.processes,
+        chunk_size=args.chunk_size,
+        dtype=np.dtype(args.dtype),
+    )
+    print(
+        f"{surface.store.num_points} points, "
+        f"{sum(vals.nbytes for vals in surface.store.arrays.values()) / 2**20:.0f} MB"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+"""
+Headless parameter sweeps over the economic sliders.
+
+Each sweep point is a full simulation. Points are split into chunks, and each
+chunk runs as one vectorized `NumpySimulation` (one run per point and seed)
+in a worker process. Chunk results are appended to a single Parquet file as
+they complete.
+
+Usage:
+
+    python sweep.py --param base_infl_rate=0.05:0.1:0.01 \\
+        --param vdtr_comm_perc=0:0.2:0.05 --output sweep.parquet
+
+Passing `--samples N` draws N Latin-hypercube points over the given bounds
+instead of a grid. Policies default to Constant, under which every run of a
+point is the same; pass `--staked-policy Proactive` and
+`--unstaked-policy Proactive` for ensembles. Passing `--store` writes a memory-mapped `ResultStore`
+directory instead, for sweeps too large to load whole.
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import itertools
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from model import BEHAVIOR2POLICY
+from store import ResultStore
+from utils import (
+    NumpySimulation,
+    build_initial_state,
+    build_system_params,
+    default_params,
+    load_constants,
+)
+
+SWEEP_PARAMS = [
+    "base_infl_rate",
+    "dis_infl_rate",
+    "long_term_infl_rate",
+    "init_perc_staked",
+    "vdtr_comm_perc",
+    "vdtr_uptime_freq",
+    "yield_location",
+    "yield_scale",
+]
+
+
+def grid(ranges):
+    """
+    Build the cartesian product of `ranges`, a dict mapping each swept param
+    to the values it takes.
+    """
+    names = list(ranges)
+    return pd.DataFrame(itertools.product(*ranges.values()), columns=names)
+
+
+def latin_hypercube(bounds, num_samples, seed=None):
+    """
+    Draw `num_samples` Latin-hypercube points, where `bounds` maps each swept
+    param to a `(low, high)` pair.
+    """
+    from scipy.stats import qmc
+
+    names = list(bounds)
+    low, high = np.array(list(bounds.values()), dtype=float).T
+    sampler = qmc.LatinHypercube(d=len(names), seed=seed)
+    return pd.DataFrame(
+        qmc.scale(sampler.random(num_samples), low, high), columns=names
+    )
+
+
+def point_params(points, base_params=None, num_runs=1):
+    """
+    Build simulation params with `num_runs` consecutive runs per row of
+    `points`.
+
+    Columns of `points` override the matching keys of `base_params`, which
+    default to `default_params`.
+    """
+    params = dict(default_params() if base_params is None else base_params)
+    for name in points.columns:
+        params[name] = np.repeat(points[name].to_numpy(dtype=float), num_runs)
+    return params
+
+
+def chunk_params(base_params, start):
+    """
+    Return `base_params`, defaulting to `default_params`, for the chunk of
+    points starting at row `start` of a sweep.
+
+    Each chunk is its own simulation, so it gets a seed of its own, derived
+    from `start` and the sweep's seed. Otherwise every chunk would replay
+    the same random stream, and identical points in different chunks would
+    follow identical paths.
+    """
+    params = dict(default_params() if base_params is None else base_params)
+    entropy = np.random.SeedSequence([params["seed"], start])
+    params["seed"] = int(entropy.generate_state(1)[0])
+    return params
+
+
+def simulate_points(
+    points, base_params=None, steps_per_run=None, num_runs=1, dtype=np.float64
+):
+    """
+    Simulate every row of `points` in a single vectorized run, returning a
+    `SimulationResult` with `num_runs` consecutive runs per row.
+
+    Columns of `points` override the matching keys of `base_params`.
+    """
+    params = point_params(points, base_params, num_runs)
+    if steps_per_run is None:
+        steps_per_run = load_constants()["total_years"] * params["steps_per_year"]
+    simulation = NumpySimulation(
+        build_system_params(params),
+        build_initial_state(params),
+        steps_per_run,
+        len(points) * num_runs,
+        dtype,
+    )
+    return simulation.result()
+
+
+def run_points(
+    points, base_params=None, steps_per_run=None, num_runs=1, dtype=np.float64
+):
+    """
+    Simulate every row of `points` with `simulate_points`.
+
+    Returns the simulation output, with state variables stored as `dtype`,
+    and a `point` column holding the index of the row in `points` that
+    produced it.
+    """
+    result = simulate_points(points, base_params, steps_per_run, num_runs, dtype)
+    df = result.to_pandas()
+    run = df["run"].to_numpy() - 1
+    df["run"] = run % num_runs + 1
+    df.insert(0, "point", points.index.to_numpy()[run // num_runs])
+    return df
+
+
+def store_points(
+    points, path, base_params=None, steps_per_run=None, num_runs=1, dtype=np.float64
+):
+    """
+    Simulate every row of `points` with `simulate_points`, writing the
+    results straight into the `ResultStore` at `path`.
+    """
+    result = simulate_points(points, base_params, steps_per_run, num_runs, dtype)
+    ResultStore.open(path, "r+").write(points.index, result)
+
+
+def run_sweep(
+    points,
+    output,
+    base_params=None,
+    steps_per_run=None,
+    num_runs=1,
+    processes=None,
+    chunk_size=1000,
+    dtype=np.float64,
+):
+    """
+    Simulate every row of `points` across a process pool, streaming results
+    to the Parquet file at `output`.
+
+    Rows are written in chunk-completion order; use the `point` column, which
+    indexes into `points`, to join results back to their parameters. Each
+    chunk is seeded by `chunk_params`.
+    """
+    writer = None
+    try:
+        with ProcessPoolExecutor(processes) as executor:
+            futures = [
+                executor.submit(
+                    run_points,
+                    points.iloc[start : start + chunk_size],
+                    chunk_params(base_params, start),
+                    steps_per_run,
+                    num_runs,
+                    dtype,
+                )
+                for start in range(0, len(points), chunk_size)
+            ]
+            for future in as_completed(futures):
+                table = pa.Table.from_pandas(future.result(), preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(output, table.schema)
+                writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def store_sweep(
+    points,
+    output,
+    base_params=None,
+    steps_per_run=None,
+    num_runs=1,
+    processes=None,
+    chunk_size=1000,
+    dtype=np.float64,
+):
+    """
+    Simulate every row of `points` across a process pool, writing results
+    to a new `ResultStore` at `output` as each chunk completes.
+
+    Each worker writes its own chunk, so results never pass through this
+    process. Each chunk is seeded by `chunk_params`. Returns the store,
+    opened read-only.
+    """
+    params = default_params() if base_params is None else base_params
+    if steps_per_run is None:
+        steps_per_run = load_constants()["total_years"] * params["steps_per_year"]
+    ResultStore.create(
+        output,
+        points,
+        list(build_initial_state(params)),
+        num_runs,
+        steps_per_run + 1,
+        dtype,
+    )
+    with ProcessPoolExecutor(processes) as executor:
+        futures = [
+            executor.submit(
+                store_points,
+                points.iloc[start : start + chunk_size],
+                output,
+                chunk_params(base_params, start),
+                steps_per_run,
+                num_runs,
+                dtype,
+            )
+            for start in range(0, len(points), chunk_size)
+        ]
+        for future in as_completed(futures):
+            future.result()
+    return ResultStore.open(output)
+
+
+def parse_param(spec):
+    """
+    Parse `name=low:high[:step]` into a name and its bounds, plus its step
+    when sweeping a grid.
+    """
+    name, _, bounds = spec.partition("=")
+    if name not in SWEEP_PARAMS:
+        raise argparse.ArgumentTypeError(f"Cannot sweep over {name}")
+    values = [float(val) for val in bounds.split(":")]
+    if len(values) not in (2, 3):
+        raise argparse.ArgumentTypeError(f"Expected low:high[:step], got {bounds}")
+    return name, values
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--param", type=parse_param, action="append", required=True)
+    parser.add_argument("--samples", type=int, help="Latin-hypercube sample size")
+    parser.add_argument(
+        "--staked-policy", choices=list(BEHAVIOR2POLICY), default="Constant"
+    )
+    parser.add_argument(
+        "--unstaked-policy", choices=list(BEHAVIOR2POLICY), default="Constant"
+    )
+    parser.add_argument(
+        "--seed", type=int, help="Seeds the Latin hypercube and the policies"
+    )
+    parser.add_argument(
+        "--steps", type=int, help="Defaults to total_years worth of timesteps"
+    )
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--dtype", choices=["float32", "float64"], default="float64")
+    parser.add_argument(
+        "--store",
+        action="store_true",
+        help="Write a memory-mapped ResultStore directory instead of Parquet",
+    )
+    parser.add_argument("--output", default="sweep.parquet")
+    args = parser.parse_args(argv)
+
+    if args.samples:
+        bounds = {name: values[:2] for name, values in args.param}
+        points = latin_hypercube(bounds, args.samples, seed=args.seed)
+    else:
+        ranges = {}
+        for name, values in args.param:
+            if len(values) == 3:
+                low, high, step = values
+                values = np.arange(low, high + step / 2, step).round(10)
+            ranges[name] = values
+        points = grid(ranges)
+    base_params = dict(
+        default_params(),
+        staked_policy=args.staked_policy,
+        unstaked_policy=args.unstaked_policy,
+    )
+    if args.seed is not None:
+        base_params["seed"] = args.seed
+    if not args.store:
+        points.to_parquet(os.path.splitext(args.output)[0] + "_points.parquet")
+    (store_sweep if args.store else run_sweep)(
+        points,
+        args.output,
+        base_params=base_params,
+        steps_per_run=args.steps,
+        num_runs=args.runs,
+        processes=args.processes,
+        chunk_size=args.chunk_size,
+        dtype=np.dtype(args.dtype),
+    )
+
+
+if __name__ == "__main__":
+    main()
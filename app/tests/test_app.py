@@ -0,0 +1,48 @@
+import os
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(__file__)), "main.py")
+
+
+def app():
+    return AppTest.from_file(MAIN, default_timeout=120)
+
+
+def assert_rendered(at):
+    assert not at.exception, [e.message for e in at.exception]
+    assert at.metric
+
+
+def test_renders_without_run():
+    assert_rendered(app().run())
+
+
+def test_run():
+    at = app().run()
+    at.sidebar.button[0].click().run()
+    assert_rendered(at)
+
+
+@pytest.mark.parametrize(
+    "settings",
+    [
+        {"policy": "Proactive", "num_runs": 100},
+        {"timestep": "epoch"},
+    ],
+)
+def test_run_with_settings(settings):
+    at = app().run()
+    if "policy" in settings:
+        at.sidebar.selectbox[0].select(settings["policy"])
+        at.sidebar.selectbox[1].select(settings["policy"])
+    if "num_runs" in settings:
+        at.sidebar.select_slider[0].set_value(settings["num_runs"])
+    if "timestep" in settings:
+        at.sidebar.selectbox[2].select(settings["timestep"])
+    at.run()
+    assert_rendered(at)
+    at.sidebar.button[0].click().run()
+    assert_rendered(at)
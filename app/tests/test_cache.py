@@ -0,0 +1,78 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from cache import SimulationCache
+from surface import ResponseSurface
+from utils import default_params, load_constants, simulate
+
+
+STEPS = load_constants()["total_years"]
+PROACTIVE = dict(
+    default_params(), staked_policy="Proactive", unstaked_policy="Proactive"
+)
+
+
+@pytest.fixture(scope="module")
+def surface(tmp_path_factory):
+    path = tmp_path_factory.mktemp("surface") / "surface"
+    return ResponseSurface.build(
+        str(path),
+        {"base_infl_rate": [0.07, 0.08, 0.09]},
+        base_params=PROACTIVE,
+        processes=1,
+    )
+
+
+def test_interpolated_results_are_labelled(surface, tmp_path):
+    cache = SimulationCache(cache_dir=str(tmp_path), surface=surface)
+    df = cache.run(PROACTIVE, STEPS, backend="numpy")
+    assert df.attrs["interpolated"]
+    streamed = list(cache.stream(PROACTIVE, STEPS, backend="numpy"))
+    assert all(chunk.attrs["interpolated"] for chunk in streamed)
+    # Only simulated results are written to disk.
+    assert not list(tmp_path.iterdir())
+
+
+def test_surface_results_are_not_served_as_simulations(surface, tmp_path):
+    SimulationCache(cache_dir=str(tmp_path), surface=surface).run(
+        PROACTIVE, STEPS, backend="numpy"
+    )
+    df = SimulationCache(cache_dir=str(tmp_path)).run(PROACTIVE, STEPS, backend="numpy")
+    assert not df.attrs["interpolated"]
+    expected = simulate(PROACTIVE, STEPS, backend="numpy")
+    np.testing.assert_array_equal(
+        df["perc_staked"].to_numpy(), expected["perc_staked"].to_numpy()
+    )
+
+
+def test_closed_form_skips_surface(tmp_path):
+    params = default_params()
+    surface = ResponseSurface.build(
+        str(tmp_path / "surface"),
+        {"base_infl_rate": [0.07, 0.08, 0.09]},
+        base_params=params,
+        processes=1,
+    )
+    assert surface.covers(params, STEPS)
+    df = SimulationCache(surface=surface).run(params, STEPS, backend="numpy")
+    assert not df.attrs["interpolated"]
+
+
+def test_import_starts_no_threads():
+    # Forked worker processes would inherit any locks its threads hold.
+    out = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import threading, cache; print(threading.active_count())",
+        ],
+        capture_output=True,
+        check=True,
+        cwd=os.path.dirname(os.path.dirname(__file__)),
+        text=True,
+    ).stdout
+    assert out.split() == ["1"]
@@ -0,0 +1,45 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+
+APP_DIR = os.path.dirname(os.path.dirname(__file__))
+BUDGET = 1.5
+# Heavy dependencies each headless module must leave to the code paths that
+# need them. sweep, cache and surface work in DataFrames throughout.
+LAZY_IMPORTS = {
+    "model": ("pandas", "scipy", "cadCAD", "streamlit", "altair"),
+    "utils": ("pandas", "scipy", "cadCAD", "streamlit", "altair"),
+    "run": ("pandas", "scipy", "cadCAD", "streamlit", "altair"),
+    "sweep": ("scipy", "cadCAD", "streamlit", "altair"),
+    "cache": ("scipy", "cadCAD", "streamlit", "altair"),
+    "surface": ("scipy", "cadCAD", "streamlit", "altair"),
+}
+# numba imports scipy itself, so it is blocked to keep it from hiding an
+# eager scipy import.
+IMPORT_SCRIPT = """
+import json, sys, time
+sys.modules["numba"] = None
+start = time.perf_counter()
+import {module}
+print(json.dumps([time.perf_counter() - start, sorted(sys.modules)]))
+"""
+
+
+@pytest.mark.parametrize("module", LAZY_IMPORTS)
+def test_cold_import(module):
+    env = {k: v for k, v in os.environ.items() if k != "SOLANA_JIT"}
+    out = subprocess.run(
+        [sys.executable, "-c", IMPORT_SCRIPT.format(module=module)],
+        capture_output=True,
+        check=True,
+        cwd=APP_DIR,
+        env=env,
+        text=True,
+    ).stdout
+    secs, modules = json.loads(out.splitlines()[-1])
+    assert secs < BUDGET
+    assert not set(LAZY_IMPORTS[module]) & set(modules)
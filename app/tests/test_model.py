@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from model import (
+    collect_states,
+    iter_agent_simulation,
+    iter_vectorized_simulation,
+    run_analytic_simulation,
+    run_vectorized_simulation,
+)
+from utils import (
+    build_initial_state,
+    build_simulation,
+    build_system_params,
+    default_params,
+)
+
+
+YEARS = 100
+
+
+def run(params, iterate):
+    system_params = build_system_params(params)
+    system_params["policy_rng"] = np.random.default_rng(0)
+    initial_state = build_initial_state(params)
+    steps = YEARS * params["steps_per_year"]
+    states = iterate(system_params, initial_state, steps, 1)
+    return collect_states(states, initial_state, steps, 1)
+
+
+@pytest.mark.parametrize("iterate", [iter_vectorized_simulation, iter_agent_simulation])
+@pytest.mark.parametrize("tolerance", [1e-5, 3e-3])
+def test_early_stop_matches_full_run(iterate, tolerance):
+    stop_years = []
+    for steps_per_year in (1, 12, 182):
+        params = dict(
+            default_params(),
+            steps_per_year=steps_per_year,
+            steady_state_tol=tolerance,
+            num_agents=1000,
+        )
+        stopped, steady_from = run(params, iterate)
+        full, _ = run(dict(params, steady_state_tol=None), iterate)
+        if steady_from is None:
+            stop_years.append(None)
+            for var, vals in full.items():
+                np.testing.assert_array_equal(stopped[var], vals)
+            continue
+        stop_years.append(steady_from / steps_per_year)
+        # Extrapolation holds the share staked, which was moving by at most
+        # `tolerance` a year.
+        years_left = YEARS - stop_years[-1]
+        error = np.abs(stopped["perc_staked"] - full["perc_staked"]).max()
+        assert error <= tolerance * years_left
+        np.testing.assert_allclose(stopped["total_supply"], full["total_supply"])
+    # The tolerance is annual, so runs stop at the same point in time
+    # whatever the timestep.
+    if None in stop_years:
+        assert stop_years == [None] * len(stop_years)
+    else:
+        assert max(stop_years) - min(stop_years) <= 2
+
+
+def test_proactive_spread_is_independent_of_timestep():
+    # Each year's keep fraction is a single draw, however many timesteps it
+    # is spread over, so finer timesteps don't average the randomness away.
+    spreads = []
+    for steps_per_year in (1, 12, 182):
+        params = dict(
+            default_params(),
+            staked_policy="Proactive",
+            unstaked_policy="Proactive",
+            steps_per_year=steps_per_year,
+        )
+        result = build_simulation(params, 20 * steps_per_year, 500).result()
+        spreads.append(np.std(result["perc_staked"][:, -1]))
+    assert max(spreads) / min(spreads) < 1.25
+
+
+@pytest.mark.parametrize("steps_per_year", [1, 12, 182])
+def test_closed_form_matches_vectorized(steps_per_year):
+    params = dict(default_params(), steps_per_year=steps_per_year)
+    system_params = build_system_params(params)
+    system_params["policy_rng"] = np.random.default_rng(0)
+    initial_state = build_initial_state(params)
+    steps = 20 * steps_per_year
+    analytic = run_analytic_simulation(system_params, initial_state, steps, 2)
+    vectorized, _ = run_vectorized_simulation(system_params, initial_state, steps, 2)
+    for var, vals in vectorized.items():
+        np.testing.assert_allclose(analytic[var], vals, rtol=1e-12, err_msg=var)
@@ -0,0 +1,20 @@
+import argparse
+
+import pytest
+
+from run import parse_param
+
+
+def test_parse_param():
+    assert parse_param("base_infl_rate=0.07") == ("base_infl_rate", 0.07)
+    assert parse_param("steps_per_year=12") == ("steps_per_year", 12)
+    assert isinstance(parse_param("steps_per_year=12")[1], int)
+    assert isinstance(parse_param("vdtr_comm_perc=0")[1], float)
+
+
+@pytest.mark.parametrize(
+    "spec", ["steps_per_year=1.5", "base_infl_rate=x", "seed=1", "nope=1"]
+)
+def test_parse_param_rejects(spec):
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_param(spec)
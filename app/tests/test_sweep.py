@@ -0,0 +1,18 @@
+import pandas as pd
+
+from sweep import run_sweep
+from utils import default_params
+
+
+PROACTIVE = dict(
+    default_params(), staked_policy="Proactive", unstaked_policy="Proactive"
+)
+
+
+def test_chunks_draw_their_own_randomness(tmp_path):
+    points = pd.DataFrame({"base_infl_rate": [0.08, 0.08]})
+    output = tmp_path / "sweep.parquet"
+    run_sweep(points, str(output), PROACTIVE, steps_per_run=20, chunk_size=1)
+    df = pd.read_parquet(output)
+    final = df[df["timestep"] == df["timestep"].max()].set_index("point")
+    assert final.loc[0, "perc_staked"] != final.loc[1, "perc_staked"]
@@ -1,29 +1,134 @@
-from collections import deque
-from enum import Enum
+import functools
 import os
 from typing import Dict
 
 from ruamel.yaml import YAML
-import pandas as pd
+import numpy as np
 
-from cadCAD.configuration import Configuration
-from cadCAD.configuration.utils import config_sim
-from cadCAD.engine import ExecutionMode, ExecutionContext, Executor
+from model import (
+    BEHAVIOR2POLICY,
+    PARTIAL_STATE_UPDATE_BLOCKS,
+    PER_STEP_RATES,
+    TIMESTEPS,
+    collect_states,
+    compute_annual_rate,
+    compute_staker_yield,
+    constant_behavior_policy,
+    extrapolate_steady_state,
+    iter_agent_simulation,
+    iter_vectorized_simulation,
+    compute_unstaked_dilution,
+    compute_staked_dilution,
+    compute_step_rate,
+    run_analytic_simulation,
+)
+from profiling import instrument, stage
+from results import SimulationResult
 
 
-def load_constants():
+CADCAD_COLUMNS = ["simulation", "subset", "run", "substep", "timestep"]
+
+
+@functools.lru_cache(maxsize=None)
+def _read_constants():
     config_path = os.path.join(os.path.dirname(__file__), "const.yaml")
-    return YAML(typ="safe").load(open(config_path))
+    with open(config_path) as f:
+        return YAML(typ="safe").load(f)
+
+
+def load_constants():
+    """
+    Return the settings in `const.yaml`, as a dict the caller may modify.
+
+    The file is only parsed on the first call in each process.
+    """
+    return dict(_read_constants())
+
+
+def default_params():
+    """
+    Return the simulation inputs at their `const.yaml` defaults.
+
+    Keys match the sliders in `main.py`. Policies are given by name, as in
+    `BEHAVIOR2POLICY`.
+    """
+    C = load_constants()
+    return {
+        "unstaked_policy": "Constant",
+        "staked_policy": "Constant",
+        "yield_location": C["yield_location"],
+        "yield_scale": C["yield_scale"],
+        "init_supply": C["initial_supply"],
+        "init_perc_staked": C["initial_fraction_staked"],
+        "base_infl_rate": C["base_inflation_rate"],
+        "dis_infl_rate": C["disinflation_rate"],
+        "long_term_infl_rate": C["long_term_inflation_rate"],
+        "vdtr_comm_perc": C["validator_commission_fraction"],
+        "vdtr_uptime_freq": C["validator_uptime_frequency"],
+        "initial_valuation": C["initial_valuation"],
+        "seed": C["seed"],
+        "steady_state_tol": C["steady_state_tol"],
+        "steady_state_window": C["steady_state_window"],
+        "steps_per_year": TIMESTEPS[C["timestep"]],
+        "num_agents": C["num_agents"],
+        "agent_balance_sigma": C["agent_balance_sigma"],
+        "agent_yield_location_sd": C["agent_yield_location_sd"],
+        "agent_yield_scale_sd": C["agent_yield_scale_sd"],
+    }
+
+
+def build_system_params(params):
+    return {
+        "base_infl_rate": params["base_infl_rate"],
+        "dis_infl_rate": params["dis_infl_rate"],
+        "long_term_infl_rate": params["long_term_infl_rate"],
+        "vdtr_comm_perc": params["vdtr_comm_perc"],
+        "vdtr_uptime_freq": params["vdtr_uptime_freq"],
+        "initial_valuation": params["initial_valuation"],
+        "unstaked_policy": BEHAVIOR2POLICY[params["unstaked_policy"]],
+        "staked_policy": BEHAVIOR2POLICY[params["staked_policy"]],
+        "yield_location": params["yield_location"],
+        "yield_scale": params["yield_scale"],
+        "seed": params["seed"],
+        "steady_state_tol": params["steady_state_tol"],
+        "steady_state_window": params["steady_state_window"],
+        "steps_per_year": params["steps_per_year"],
+        "num_agents": params["num_agents"],
+        "agent_balance_sigma": params["agent_balance_sigma"],
+        "agent_yield_location_sd": params["agent_yield_location_sd"],
+        "agent_yield_scale_sd": params["agent_yield_scale_sd"],
+    }
+
+
+def build_initial_state(params):
+    base_infl_rate = params["base_infl_rate"]
+    init_perc_staked = params["init_perc_staked"]
+    inflation = compute_step_rate(base_infl_rate, params["steps_per_year"])
+    return {
+        "inflation": inflation,
+        "perc_staked": init_perc_staked,
+        "sol_staked": init_perc_staked * params["init_supply"],
+        "total_supply": params["init_supply"],
+        "staker_yield": compute_staker_yield(
+            base_infl_rate,
+            params["vdtr_uptime_freq"],
+            params["vdtr_comm_perc"],
+            init_perc_staked,
+        ),
+        "unstaked_dilution": compute_unstaked_dilution(inflation),
+        "staked_dilution": compute_staked_dilution(inflation, init_perc_staked),
+        "unstaked_valuation": params["initial_valuation"],
+        "staked_valuation": params["initial_valuation"],
+    }
 
 
 class CadCadSimulationBuilder:
 
     USER_ID = "streamlit"
     MODEL_ID = "solana-economics"
-    EXEC_MODE = ExecutionMode()
-    EXEC_CONTEXT = ExecutionContext(EXEC_MODE.single_proc)
 
     @classmethod
+    @instrument("simulation.build")
     def build(
         cls,
         system_params: Dict,
@@ -31,28 +136,303 @@ class CadCadSimulationBuilder:
         partial_state_update_blocks: Dict,
         steps_per_run: int = 100,
         num_runs: int = 1,
+        backend: str = "cadcad",
+        dtype=np.float64,
     ):
-        # Build config
-        config = Configuration(
-            user_id=cls.USER_ID,
-            model_id=cls.MODEL_ID,
-            subset_id=None,
-            subset_window=deque([0, None]),
-            run_id=0,
-            initial_state=initial_state,
-            partial_state_update_blocks=partial_state_update_blocks,
-            sim_config={"T": range(steps_per_run), "N": num_runs, "M": system_params},
-        )
-        # Define executor
-        executor = Executor(cls.EXEC_CONTEXT, [config])
-        return CadCadSimulation(executor)
+        if backend == "numpy":
+            return NumpySimulation(
+                system_params, initial_state, steps_per_run, num_runs, dtype
+            )
+        if backend == "agents":
+            return AgentSimulation(
+                system_params, initial_state, steps_per_run, num_runs, dtype
+            )
+        if backend != "cadcad":
+            raise ValueError(f"Unknown simulation backend: {backend}")
+        # cadCAD is slow to import, and only this backend needs it.
+        from cadCAD.configuration import Experiment
+        from cadCAD.configuration.utils import config_sim
+        from cadCAD.engine import ExecutionMode, ExecutionContext, Executor
+
+        def build_executor():
+            # A fresh generator per execution, so rerunning the simulation
+            # reproduces it, as `NumpySimulation.result` does.
+            params = {
+                **system_params,
+                "policy_rng": np.random.default_rng(system_params["seed"]),
+            }
+            # Build config. cadCAD 0.5 runs one configuration per run, which
+            # `append_model` expands from `N`.
+            experiment = Experiment()
+            experiment.append_model(
+                user_id=cls.USER_ID,
+                model_id=cls.MODEL_ID,
+                sim_configs=config_sim(
+                    {"T": range(steps_per_run), "N": num_runs, "M": params}
+                ),
+                initial_state=initial_state,
+                partial_state_update_blocks=partial_state_update_blocks,
+            )
+            # Define executor
+            return Executor(
+                ExecutionContext(ExecutionMode().single_proc), experiment.configs
+            )
+
+        return CadCadSimulation(build_executor, list(initial_state), dtype)
+
+
+def build_simulation(
+    params=None, steps_per_run=None, num_runs=1, backend=None, dtype=np.float64
+):
+    """
+    Build, without running, the simulation for `params`.
+
+    `params` overrides any subset of `default_params`. The horizon defaults
+    to `total_years` worth of timesteps, and the backend to `backend`, both
+    from `const.yaml`. State variables are stored as `dtype`.
+    """
+    C = load_constants()
+    params = {**default_params(), **(params or {})}
+    if steps_per_run is None:
+        steps_per_run = C["total_years"] * params["steps_per_year"]
+    return CadCadSimulationBuilder.build(
+        system_params=build_system_params(params),
+        initial_state=build_initial_state(params),
+        partial_state_update_blocks=PARTIAL_STATE_UPDATE_BLOCKS,
+        steps_per_run=steps_per_run,
+        num_runs=num_runs,
+        backend=C["backend"] if backend is None else backend,
+        dtype=dtype,
+    )
+
+
+def simulate(
+    params=None, steps_per_run=None, num_runs=1, backend=None, dtype=np.float64
+):
+    """
+    Run the simulation and return its results as a DataFrame. Arguments are
+    as for `build_simulation`.
+    """
+    return build_simulation(params, steps_per_run, num_runs, backend, dtype).run()
+
+
+def resample_yearly(df, steps_per_year):
+    """
+    Keep the rows of `df` that fall on a year boundary, for a simulation
+    stepped `steps_per_year` times a year, with `timestep` counting years.
+
+    Rates over a single timestep, in `PER_STEP_RATES`, are annualized.
+    """
+    if steps_per_year == 1:
+        return df
+    df = df[df["timestep"] % steps_per_year == 0].copy()
+    df["timestep"] //= steps_per_year
+    for var in PER_STEP_RATES:
+        df[var] = compute_annual_rate(df[var].to_numpy(), steps_per_year)
+    if df.attrs.get("steady_from") is not None:
+        df.attrs["steady_from"] = -(-df.attrs["steady_from"] // steps_per_year)
+    return df
+
+
+def summarize_ensemble(df, columns=None, percentiles=(5, 50, 95)):
+    """
+    Reduce a multi-run simulation to per-timestep mean and percentile bands.
+
+    The mean keeps the original column name, and each percentile `p` is
+    stored as `<column>_p<p>`, e.g. `perc_staked_p5`.
+    """
+    if columns is None:
+        columns = [col for col in df.columns if col not in CADCAD_COLUMNS]
+    grouped = df.groupby("timestep")[columns]
+    summary = grouped.mean()
+    for p in percentiles:
+        summary = summary.join(grouped.quantile(p / 100).add_suffix(f"_p{p}"))
+    return summary.reset_index()
+
+
+class SimulationCancelled(Exception):
+    """
+    Raised by `result` when its `cancelled` event is set mid-run.
+    """
+
+
+def monitor(states, num_timesteps, progress=None, cancelled=None):
+    """
+    Pass `states` through, one timestep at a time, reporting the fraction of
+    `num_timesteps` done to `progress` and stopping with
+    `SimulationCancelled` as soon as `cancelled`, a `threading.Event`, is set.
+    """
+    for timestep, state in enumerate(states):
+        if cancelled is not None and cancelled.is_set():
+            raise SimulationCancelled()
+        yield state
+        if progress is not None:
+            progress((timestep + 1) / num_timesteps)
 
 
 class CadCadSimulation:
-    def __init__(self, executor):
-        self.executor = executor
+    """
+    A cadCAD simulation, built afresh by `build_executor` on every run.
+
+    Every run draws from one generator seeded by `seed`, run after run, so
+    a run's draws depend on the runs before it. With more than one run,
+    this differs from `NumpySimulation`, which draws for every run at once
+    at each timestep. A single run draws the same values on both.
+    """
+
+    def __init__(self, build_executor, variables, dtype=np.float64):
+        self.build_executor = build_executor
+        self.variables = variables
+        self.dtype = dtype
+
+    def result(self, progress=None, cancelled=None):
+        """
+        Run every run to completion. cadCAD has no hook between timesteps, so
+        `cancelled` is only checked before starting, and `progress` only
+        hears when it is done. See `NumpySimulation.result`.
+        """
+        if cancelled is not None and cancelled.is_set():
+            raise SimulationCancelled()
+        with stage("simulation.execute"):
+            flat_results, tensor_fields, sessions = self.build_executor().execute()
+        if progress is not None:
+            progress(1.0)
+        with stage("simulation.pack"):
+            return SimulationResult.from_flat_results(
+                flat_results, self.variables, self.dtype
+            )
 
     def run(self):
-        flat_results, tensor_fields, sessions = self.executor.execute()
-        df = pd.DataFrame(flat_results)
-        return df
+        result = self.result()
+        with stage("simulation.to_dataframe"):
+            return result.to_pandas()
+
+    def stream(self, chunk_size=1):
+        """
+        cadCAD only returns once every run is done, so this yields the whole
+        result as one chunk. See `NumpySimulation.stream`.
+        """
+        yield self.result()
+
+
+class NumpySimulation:
+    """
+    Vectorized alternative to `CadCadSimulation`.
+
+    Advances all runs at once with `iter_vectorized_simulation`, or solves
+    them in closed form with `run_analytic_simulation` when both policies are
+    constant. Results are the same `SimulationResult` as `CadCadSimulation`
+    returns.
+
+    Each `result` draws from one generator seeded by `seed`, for every run at
+    once at each timestep, so it reproduces for the same `seed` and
+    `num_runs`. Runs do not have their own streams: a run's draws change with
+    `num_runs`, since that would mean a generator call per run per timestep
+    rather than one per timestep.
+    """
+
+    iterate = staticmethod(iter_vectorized_simulation)
+
+    def __init__(
+        self, system_params, initial_state, steps_per_run, num_runs, dtype=np.float64
+    ):
+        self.system_params = system_params
+        self.initial_state = initial_state
+        self.steps_per_run = steps_per_run
+        self.num_runs = num_runs
+        self.dtype = dtype
+
+    @property
+    def is_analytic(self):
+        return all(
+            self.system_params[policy] is constant_behavior_policy
+            for policy in ("staked_policy", "unstaked_policy")
+        )
+
+    def result(self, progress=None, cancelled=None):
+        """
+        Run every run to completion.
+
+        `progress`, if given, is called with the fraction of timesteps done
+        after each one. Setting `cancelled`, a `threading.Event`, from another
+        thread stops the run at the next timestep with `SimulationCancelled`.
+        The closed form is solved in one go, so it only checks `cancelled`
+        before starting.
+        """
+        system_params = {
+            **self.system_params,
+            "policy_rng": np.random.default_rng(self.system_params["seed"]),
+        }
+        args = (system_params, self.initial_state, self.steps_per_run, self.num_runs)
+        with stage("simulation.execute"):
+            if self.is_analytic:
+                if cancelled is not None and cancelled.is_set():
+                    raise SimulationCancelled()
+                history = run_analytic_simulation(*args, self.dtype)
+                if progress is not None:
+                    progress(1.0)
+                return SimulationResult(history)
+            states = monitor(
+                self.iterate(*args), self.steps_per_run + 1, progress, cancelled
+            )
+            history, steady_from = collect_states(states, *args[1:], self.dtype)
+            return SimulationResult(history, steady_from=steady_from)
+
+    def run(self):
+        result = self.result()
+        with stage("simulation.to_dataframe"):
+            return result.to_pandas()
+
+    def stream(self, chunk_size=1):
+        """
+        Yield the result as it is computed, as `SimulationResult` chunks of
+        `chunk_size` timesteps across every run.
+
+        Only the chunk being filled is held, so consumers that reduce or
+        discard chunks run in bounded memory.
+        """
+        if self.is_analytic:
+            # The closed form is cheap enough to solve whole, then slice.
+            result = self.result()
+            for start in range(0, result.num_timesteps, chunk_size):
+                yield result.timesteps(start, start + chunk_size)
+            return
+        system_params = {
+            **self.system_params,
+            "policy_rng": np.random.default_rng(self.system_params["seed"]),
+        }
+        states = self.iterate(
+            system_params, self.initial_state, self.steps_per_run, self.num_runs
+        )
+        num_timesteps = self.steps_per_run + 1
+        steady_from = tail = None
+        for start in range(0, num_timesteps, chunk_size):
+            size = min(chunk_size, num_timesteps - start)
+            chunk = {
+                var: np.empty((self.num_runs, size), self.dtype)
+                for var in self.initial_state
+            }
+            for i in range(size):
+                if tail is None:
+                    with stage("simulation.execute"):
+                        next_state = next(states, None)
+                    if next_state is not None:
+                        state = next_state
+                        for var, vals in state.items():
+                            chunk[var][:, i] = vals
+                        continue
+                    steady_from = start + i
+                    tail = extrapolate_steady_state(state, num_timesteps - steady_from)
+                for var, vals in tail.items():
+                    chunk[var][:, i] = vals[:, start + i - steady_from]
+            yield SimulationResult(chunk, start, steady_from)
+
+
+class AgentSimulation(NumpySimulation):
+    """
+    `NumpySimulation` of individual holders rather than two cohorts. See
+    `iter_agent_simulation`.
+    """
+
+    iterate = staticmethod(iter_agent_simulation)
+    is_analytic = False